@@ -1,6 +1,11 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify, flash, send_file
+from flask import (
+    Flask, Response, render_template, request, redirect, url_for, jsonify, flash,
+    make_response, send_file, session, stream_with_context
+)
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import text
+from sqlalchemy import and_, case, event, text, select, insert, update, func, inspect, tuple_, type_coerce
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError, OperationalError, ProgrammingError
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
@@ -13,11 +18,25 @@ from werkzeug.utils import secure_filename
 from datetime import datetime, date, timedelta
 import os
 import csv
+import gzip
+import hashlib
+import json
+import re
 import io
+import atexit
 import secrets
+import sqlite3
+import tempfile
 import threading
+import time
+from collections import OrderedDict, deque
+from functools import cached_property
+from itertools import islice
+
+import click
 
 from config import Config
+from hours import HAVE_NUMPY, TIME_FIELDS, entry_minutes, entry_times, work_and_break_minutes
 
 app = Flask(__name__)
 app.config.from_object(Config)
@@ -35,6 +54,29 @@ db = SQLAlchemy(app)
 login_manager = LoginManager(app)
 login_manager.login_view = "login"
 
+
+# ---------------- DATABASE ----------------
+def _sqlite_pragmas(dbapi_conn, connection_record):
+    """Production PRAGMAs for each new SQLite connection.
+
+    WAL lets readers run alongside the single writer, synchronous=NORMAL
+    skips the fsync on every commit (still durable across app crashes), and
+    busy_timeout makes writers wait for the lock instead of failing.
+    """
+    cursor = dbapi_conn.cursor()
+    cursor.execute(f"PRAGMA journal_mode={app.config['SQLITE_JOURNAL_MODE']}")
+    cursor.execute(f"PRAGMA synchronous={app.config['SQLITE_SYNCHRONOUS']}")
+    cursor.execute(f"PRAGMA busy_timeout={int(app.config['SQLITE_BUSY_TIMEOUT_MS'])}")
+    cursor.execute(f"PRAGMA cache_size=-{int(app.config['SQLITE_CACHE_SIZE_KB'])}")
+    cursor.execute(f"PRAGMA mmap_size={int(app.config['SQLITE_MMAP_SIZE'])}")
+    cursor.execute(f"PRAGMA temp_store={app.config['SQLITE_TEMP_STORE']}")
+    cursor.close()
+
+
+with app.app_context():
+    if db.engine.dialect.name == "sqlite":
+        event.listen(db.engine, "connect", _sqlite_pragmas)
+
 # ---------------- MODELS ----------------
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -74,6 +116,11 @@ class TimeEntry(db.Model):
     approved_by = db.Column(db.Integer)  # Admin ID who approved
     approved_at = db.Column(db.DateTime)
 
+    __table_args__ = (
+        db.Index('ux_time_entry_user_day', 'user_id', 'day', unique=True),
+        db.Index('ix_time_entry_day', 'day'),
+    )
+
 
 class ActivityLog(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -82,6 +129,13 @@ class ActivityLog(db.Model):
     details = db.Column(db.Text)
     timestamp = db.Column(db.DateTime, default=datetime.now)
 
+    # Keyset pagination walks (timestamp, id); filters lead with their column.
+    __table_args__ = (
+        db.Index('ix_activity_log_time', 'timestamp', 'id'),
+        db.Index('ix_activity_log_user_time', 'user_id', 'timestamp', 'id'),
+        db.Index('ix_activity_log_action_time', 'action', 'timestamp', 'id'),
+    )
+
 
 class SystemSettings(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -104,6 +158,36 @@ class WeekApproval(db.Model):
     approved_at = db.Column(db.DateTime)
     locked = db.Column(db.Boolean, default=True)
 
+    __table_args__ = (
+        db.Index('ix_week_approval_user_week', 'user_id', 'week_start', 'week_end', 'locked'),
+    )
+
+
+class DailyTotals(db.Model):
+    user_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    day = db.Column(db.Date, primary_key=True)
+    work_minutes = db.Column(db.Integer, nullable=False, default=0)
+    break_minutes = db.Column(db.Integer, nullable=False, default=0)
+    overtime_minutes = db.Column(db.Integer, nullable=False, default=0)  # beyond working_hours_per_day
+    updated_at = db.Column(db.DateTime, default=datetime.now)
+
+    __table_args__ = (
+        db.Index('ix_daily_totals_day', 'day'),
+    )
+
+
+class WeeklyTotals(db.Model):
+    user_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    week_start = db.Column(db.Date, primary_key=True)
+    work_minutes = db.Column(db.Integer, nullable=False, default=0)
+    break_minutes = db.Column(db.Integer, nullable=False, default=0)
+    overtime_minutes = db.Column(db.Integer, nullable=False, default=0)  # beyond overtime_threshold_hours
+    updated_at = db.Column(db.DateTime, default=datetime.now)
+
+    __table_args__ = (
+        db.Index('ix_weekly_totals_week', 'week_start'),
+    )
+
 
 class LeaveRequest(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -143,6 +227,11 @@ class Roster(db.Model):
     notes = db.Column(db.Text)
     role_title = db.Column(db.String(100))
 
+    __table_args__ = (
+        db.Index('ix_roster_user_day_week', 'user_id', 'day_of_week', 'week_start'),
+        db.Index('ix_roster_week', 'week_start'),
+    )
+
 
 class HandoverMessage(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -160,47 +249,109 @@ class PasswordReset(db.Model):
     is_used = db.Column(db.Boolean, default=False)
 
 
+class OutboundEmail(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    to_email = db.Column(db.String(200), nullable=False)
+    subject = db.Column(db.String(200))
+    body = db.Column(db.Text)
+    status = db.Column(db.String(20), default='pending')  # pending, sending, sent, failed
+    attempts = db.Column(db.Integer, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.now)
+    claimed_by = db.Column(db.String(20))
+    claimed_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    sent_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_outbound_email_due', 'status', 'next_attempt_at'),
+    )
+
+
+class IdempotencyKey(db.Model):
+    """Stored response for a retried API request, per user and client key."""
+    user_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    key = db.Column(db.String(100), primary_key=True)
+    status_code = db.Column(db.Integer, nullable=False)
+    response = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+
+    __table_args__ = (
+        db.Index('ix_idempotency_key_created', 'created_at'),
+    )
+
+
+class CacheVersion(db.Model):
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+class SchemaVersion(db.Model):
+    version = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    description = db.Column(db.String(200))
+    applied_at = db.Column(db.DateTime, default=datetime.now)
+
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    user = user_cache.get(int(user_id))
+    # Deactivated accounts are signed out on their next request.
+    if user is None or not user.is_active:
+        return None
+    return user
 
 
 # ---------------- EMAIL HELPER ----------------
+def _mail_sender():
+    return app.config.get("MAIL_FROM") or app.config.get("MAIL_USERNAME")
+
+
+def _build_message(to_email, subject, body):
+    msg = MIMEMultipart()
+    msg["From"] = _mail_sender()
+    msg["To"] = to_email
+    msg["Subject"] = subject
+    msg.attach(MIMEText(body, "plain"))
+    return msg
+
+
+def _smtp_connect():
+    mail_server = app.config.get("MAIL_SERVER")
+    mail_port = app.config.get("MAIL_PORT", 587)
+    mail_username = app.config.get("MAIL_USERNAME")
+    mail_password = app.config.get("MAIL_PASSWORD")
+    timeout = app.config.get("MAIL_TIMEOUT", 10)
+
+    if app.config.get("MAIL_USE_SSL", False):
+        server = smtplib.SMTP_SSL(mail_server, mail_port, timeout=timeout)
+    else:
+        server = smtplib.SMTP(mail_server, mail_port, timeout=timeout)
+        if app.config.get("MAIL_USE_TLS", True):
+            server.starttls()
+
+    if mail_username and mail_password:
+        server.login(mail_username, mail_password)
+    return server
+
+
+def _print_email(to_email, subject, body):
+    print(f"\n📧 EMAIL SENT (console)")
+    print(f"   To: {to_email}")
+    print(f"   Subject: {subject}")
+    print(f"   Body: {body}")
+    print()
+
+
 def send_email(to_email, subject, body):
     """Send email notification (simple version - can use sendgrid/mailgun in production)"""
     try:
-        mail_server = app.config.get("MAIL_SERVER")
-        mail_port = app.config.get("MAIL_PORT", 587)
-        mail_username = app.config.get("MAIL_USERNAME")
-        mail_password = app.config.get("MAIL_PASSWORD")
-        mail_use_tls = app.config.get("MAIL_USE_TLS", True)
-        mail_use_ssl = app.config.get("MAIL_USE_SSL", False)
-        mail_from = app.config.get("MAIL_FROM") or mail_username
-
-        if not mail_server or not mail_from:
-            print(f"\n📧 EMAIL SENT (console)")
-            print(f"   To: {to_email}")
-            print(f"   Subject: {subject}")
-            print(f"   Body: {body}")
-            print()
+        mail_from = _mail_sender()
+        if not app.config.get("MAIL_SERVER") or not mail_from:
+            _print_email(to_email, subject, body)
             return True
 
-        msg = MIMEMultipart()
-        msg["From"] = mail_from
-        msg["To"] = to_email
-        msg["Subject"] = subject
-        msg.attach(MIMEText(body, "plain"))
-
-        if mail_use_ssl:
-            server = smtplib.SMTP_SSL(mail_server, mail_port)
-        else:
-            server = smtplib.SMTP(mail_server, mail_port)
-            if mail_use_tls:
-                server.starttls()
-
-        if mail_username and mail_password:
-            server.login(mail_username, mail_password)
-
+        msg = _build_message(to_email, subject, body)
+        server = _smtp_connect()
         server.sendmail(mail_from, [to_email], msg.as_string())
         server.quit()
         return True
@@ -227,34 +378,208 @@ def send_sms(to_phone, message):
 
 
 def send_email_async(to_email, subject, body):
-    t = threading.Thread(target=send_email, args=(to_email, subject, body), daemon=True)
-    t.start()
-
-
-# ---------------- HELPERS ----------------
-def get_today_entry():
-    entry = TimeEntry.query.filter_by(
-        user_id=current_user.id,
-        day=date.today()
-    ).first()
-
-    if not entry:
-        entry = TimeEntry(
-            user_id=current_user.id,
-            day=date.today()
+    """Queue an email for the mail workers.
+
+    The row joins the caller's transaction; the workers are woken once it
+    commits.
+    """
+    db.session.add(OutboundEmail(to_email=to_email, subject=subject, body=body))
+    db.session.info["mail_queued"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_mail_workers(session):
+    if session.info.pop("mail_queued", False):
+        mail_queue.wake()
+
+
+class MailQueue:
+    """Bounded pool of mail workers draining the outbound_email table.
+
+    Each worker claims a batch of due messages, sends them over one SMTP
+    connection that is kept open between batches for MAIL_IDLE_SECONDS, and
+    reschedules failures with exponential backoff up to MAIL_MAX_ATTEMPTS.
+    """
+
+    def __init__(self):
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._pid = None
+        self._latencies = deque(maxlen=500)
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+
+    def wake(self):
+        self.start()
+        self._wake.set()
+
+    def ensure_started(self):
+        """Start this process's pool once, so retries and stuck sends left
+        by a recycled worker are picked up without waiting for new mail."""
+        if self._pid != os.getpid():
+            self.start()
+
+    def start(self):
+        if not app.config.get("MAIL_ENABLED", True):
+            return
+        with self._lock:
+            # Per process: forked workers each run their own pool.
+            self._pid = os.getpid()
+            self._threads = [t for t in self._threads if t.is_alive()]
+            while len(self._threads) < app.config.get("MAIL_WORKERS", 2):
+                t = threading.Thread(target=self._run, daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def _run(self):
+        server = None
+        last_used = 0.0
+        while True:
+            try:
+                with app.app_context():
+                    batch = self._claim()
+                    if batch:
+                        server = self._send_batch(server, batch)
+                        last_used = time.monotonic()
+                        continue
+            except Exception as e:
+                print(f"Mail worker error: {e}")
+                server = self._close(server)
+
+            if server and time.monotonic() - last_used > app.config.get("MAIL_IDLE_SECONDS", 60):
+                server = self._close(server)
+            self._wake.wait(timeout=app.config.get("MAIL_POLL_SECONDS", 10))
+            self._wake.clear()
+
+    def _claim(self):
+        now = datetime.now()
+        stale = now - timedelta(seconds=app.config.get("MAIL_CLAIM_TIMEOUT", 300))
+        token = secrets.token_hex(8)
+        is_due = (
+            ((OutboundEmail.status == "pending") & (OutboundEmail.next_attempt_at <= now))
+            | ((OutboundEmail.status == "sending") & (OutboundEmail.claimed_at < stale))
+        )
+        ids = db.session.execute(
+            select(OutboundEmail.id).where(is_due).order_by(OutboundEmail.id)
+            .limit(app.config.get("MAIL_BATCH_SIZE", 20))
+        ).scalars().all()
+        if not ids:
+            db.session.rollback()
+            return []
+        # Re-check the due condition in the UPDATE so a row claimed by
+        # another worker in the meantime is skipped.
+        db.session.execute(
+            update(OutboundEmail)
+            .where(OutboundEmail.id.in_(ids), is_due)
+            .values(status="sending", claimed_by=token, claimed_at=now)
+            .execution_options(synchronize_session=False)
         )
-        db.session.add(entry)
         db.session.commit()
+        return OutboundEmail.query.filter_by(status="sending", claimed_by=token).all()
+
+    def _send_batch(self, server, batch):
+        mail_from = _mail_sender()
+        console = not app.config.get("MAIL_SERVER") or not mail_from
+        for email in batch:
+            started = time.monotonic()
+            try:
+                if console:
+                    _print_email(email.to_email, email.subject, email.body)
+                else:
+                    server = self._ensure_connected(server)
+                    msg = _build_message(email.to_email, email.subject, email.body)
+                    server.sendmail(mail_from, [email.to_email], msg.as_string())
+            except Exception as e:
+                print(f"Email error: {e}")
+                server = self._close(server)
+                self._reschedule(email, e)
+                continue
+            email.status = "sent"
+            email.sent_at = datetime.now()
+            email.attempts += 1
+            self._record(time.monotonic() - started)
+        db.session.commit()
+        return server
+
+    def _reschedule(self, email, error):
+        email.attempts += 1
+        email.last_error = str(error)[:500]
+        if email.attempts >= app.config.get("MAIL_MAX_ATTEMPTS", 5):
+            email.status = "failed"
+            with self._lock:
+                self.failed += 1
+            return
+        delay = app.config.get("MAIL_RETRY_SECONDS", 30) * 2 ** (email.attempts - 1)
+        email.status = "pending"
+        email.next_attempt_at = datetime.now() + timedelta(seconds=delay)
+        with self._lock:
+            self.retried += 1
+
+    def _ensure_connected(self, server):
+        if server is not None:
+            try:
+                if server.noop()[0] == 250:
+                    return server
+            except smtplib.SMTPException:
+                pass
+            self._close(server)
+        return _smtp_connect()
+
+    def _close(self, server):
+        if server is not None:
+            try:
+                server.quit()
+            except Exception:
+                pass
+        return None
 
-    return entry
+    def _record(self, seconds):
+        with self._lock:
+            self.sent += 1
+            self._latencies.append(seconds)
+
+    def stats(self):
+        depth = dict(
+            db.session.query(OutboundEmail.status, func.count())
+            .filter(OutboundEmail.status.in_(["pending", "sending", "failed"]))
+            .group_by(OutboundEmail.status)
+            .all()
+        )
+        with self._lock:
+            latencies = sorted(self._latencies)
+            sent, retried, failed = self.sent, self.retried, self.failed
+            workers = len([t for t in self._threads if t.is_alive()])
+        def pct(p):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 1)
+        return {
+            "queue_depth": depth.get("pending", 0) + depth.get("sending", 0),
+            "failed_in_queue": depth.get("failed", 0),
+            "workers": workers,
+            "sent": sent,
+            "retried": retried,
+            "failed": failed,
+            "send_latency_ms": {"p50": pct(0.5), "p95": pct(0.95), "max": pct(1.0)},
+        }
+
+
+mail_queue = MailQueue()
 
 
-def minutes(a, b):
-    if not a or not b:
-        return 0
-    if b < a:
-        b = b + timedelta(days=1)
-    return int((b - a).total_seconds() // 60)
+# ---------------- HELPERS ----------------
+def get_today_entry(create=True):
+    """The current user's entry for today.
+
+    The row is created atomically when missing (see get_or_create_entry) and
+    committed by the caller. With create=False a missing row stays missing
+    and None is returned, so read-only pages never write.
+    """
+    if create:
+        return get_or_create_entry(current_user.id, date.today())
+    return TimeEntry.query.filter_by(user_id=current_user.id, day=date.today()).first()
 
 
 def format_time(dt):
@@ -302,82 +627,570 @@ def normalize_phone(value):
     return digits or None
 
 
-def log_activity(action, details=""):
-    """Log user activity"""
-    if current_user.is_authenticated:
-        log = ActivityLog(user_id=current_user.id, action=action, details=details)
-        db.session.add(log)
-        db.session.commit()
-
+def log_activity(action, details="", buffered=False):
+    """Log user activity as part of the caller's transaction.
+
+    The row is committed together with the change it describes. High-volume
+    events pass buffered=True; with ACTIVITY_LOG_BUFFERED enabled they are
+    queued and bulk-inserted by the background flusher instead.
+    """
+    if not current_user.is_authenticated:
+        return
+    if buffered and app.config.get("ACTIVITY_LOG_BUFFERED", False):
+        activity_buffer.add({
+            "user_id": current_user.id,
+            "action": action,
+            "details": details,
+            "timestamp": datetime.now()
+        })
+        return
+    db.session.add(ActivityLog(user_id=current_user.id, action=action, details=details))
+
+
+class ActivityLogBuffer:
+    """Queue of ActivityLog rows bulk-inserted in batches by a daemon thread.
+
+    The flusher wakes every ACTIVITY_LOG_FLUSH_SECONDS, or as soon as
+    ACTIVITY_LOG_BATCH_SIZE rows are waiting. Whatever is left is flushed at
+    interpreter exit.
+    """
+
+    def __init__(self):
+        self._rows = []
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def add(self, row):
+        with self._cond:
+            self._rows.append(row)
+            # Started lazily so forked workers each get their own flusher.
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            if len(self._rows) >= app.config.get("ACTIVITY_LOG_BATCH_SIZE", 200):
+                self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait(timeout=app.config.get("ACTIVITY_LOG_FLUSH_SECONDS", 2))
+            self.flush()
+
+    def flush(self):
+        with self._cond:
+            rows, self._rows = self._rows, []
+        if not rows:
+            return 0
+        with app.app_context():
+            try:
+                db.session.execute(ActivityLog.__table__.insert(), rows)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f"Activity log flush error: {e}")
+                with self._cond:
+                    self._rows[:0] = rows
+                return 0
+        # Buffered clock events only become visible to the shift board now.
+        shift_board.notify()
+        return len(rows)
+
+    def pending(self):
+        with self._cond:
+            return len(self._rows)
+
+
+activity_buffer = ActivityLogBuffer()
+atexit.register(activity_buffer.flush)
+
+
+# ---------------- MIGRATIONS ----------------
+def _migrate_legacy_columns(conn):
+    """Create missing tables and add columns introduced after the first release."""
+    db.metadata.create_all(bind=conn)
+    inspector = inspect(conn)
+    legacy_columns = [
+        ("time_entry", "shift_notes", "shift_notes TEXT"),
+        ("user", "phone", "phone TEXT"),
+        ("user", "is_staff", "is_staff BOOLEAN DEFAULT 1"),
+        ("user", "position", "position TEXT"),
+        ("user", "visa_type", "visa_type TEXT"),
+        ("user", "weekly_hour_limit", "weekly_hour_limit FLOAT"),
+        ("system_settings", "overtime_threshold_hours", "overtime_threshold_hours FLOAT DEFAULT 40.0"),
+        ("system_settings", "overtime_multiplier", "overtime_multiplier FLOAT DEFAULT 1.5"),
+        ("roster", "week_start", "week_start DATE"),
+        ("roster", "week_end", "week_end DATE"),
+        ("roster", "is_off", "is_off BOOLEAN DEFAULT 0"),
+        ("roster", "notes", "notes TEXT"),
+        ("roster", "role_title", "role_title TEXT"),
+    ]
+    existing = {}
+    for table, column, column_def in legacy_columns:
+        if table not in existing:
+            existing[table] = {col["name"] for col in inspector.get_columns(table)}
+        if column not in existing[table]:
+            conn.execute(text(f'ALTER TABLE "{table}" ADD COLUMN {column_def}'))
+
+
+def _migrate_lookup_indexes(conn):
+    """Create the composite lookup indexes declared on the models."""
+    for model in (TimeEntry, Roster, WeekApproval):
+        for index in model.__table__.indexes:
+            columns = list(index.columns)
+            if index.unique and conn.execute(
+                select(*columns).group_by(*columns).having(func.count() > 1).limit(1)
+            ).first():
+                # Older databases can hold duplicate rows for a unique key.
+                # Fall back to a plain index so lookups stay fast until they
+                # are merged.
+                print(f"Schema warning: could not create {index.name} (duplicate rows)")
+                names = ", ".join(col.name for col in columns)
+                fallback = index.name.replace("ux_", "ix_", 1)
+                conn.execute(text(
+                    f"CREATE INDEX IF NOT EXISTS {fallback} ON {model.__tablename__} ({names})"
+                ))
+                continue
+            index.create(bind=conn, checkfirst=True)
+
+
+def _migrate_cache_versions(conn):
+    CacheVersion.__table__.create(bind=conn, checkfirst=True)
+
+
+def _migrate_outbound_email(conn):
+    OutboundEmail.__table__.create(bind=conn, checkfirst=True)
+
+
+def _migrate_activity_log_indexes(conn):
+    for index in ActivityLog.__table__.indexes:
+        index.create(bind=conn, checkfirst=True)
+
+
+def _migrate_idempotency_keys(conn):
+    IdempotencyKey.__table__.create(bind=conn, checkfirst=True)
+
+
+def merge_duplicate_entries(conn):
+    """Fold duplicate (user_id, day) TimeEntry rows into one per day.
+
+    Older releases could create a second row for the same day when two
+    requests raced. The row with the most punches is kept and its empty
+    fields are filled from the others. Returns the number of rows removed.
+    """
+    table = TimeEntry.__table__
+    fields = TIME_FIELDS + ("notes", "shift_notes", "approved_by", "approved_at")
+    groups = conn.execute(
+        select(table.c.user_id, table.c.day)
+        .group_by(table.c.user_id, table.c.day)
+        .having(func.count() > 1)
+    ).all()
+    removed = 0
+    for user_id, day in groups:
+        rows = conn.execute(
+            select(table).where(table.c.user_id == user_id, table.c.day == day).order_by(table.c.id)
+        ).mappings().all()
+        keep = max(rows, key=lambda row: (sum(row[field] is not None for field in TIME_FIELDS), -row["id"]))
+        values = {}
+        for field in fields:
+            if keep[field] is None:
+                value = next((row[field] for row in rows if row[field] is not None), None)
+                if value is not None:
+                    values[field] = value
+        if values:
+            conn.execute(table.update().where(table.c.id == keep["id"]).values(**values))
+        extra = [row["id"] for row in rows if row["id"] != keep["id"]]
+        conn.execute(table.delete().where(table.c.id.in_(extra)))
+        removed += len(extra)
+    return removed
+
+
+def _migrate_unique_time_entries(conn):
+    """Merge duplicate day rows and enforce one TimeEntry per user per day."""
+    removed = merge_duplicate_entries(conn)
+    if removed:
+        print(f"Merged {removed} duplicate time entries")
+        rebuild_totals(conn)
+    # Fallback index left by migration 2 when duplicates blocked the unique one.
+    conn.execute(text("DROP INDEX IF EXISTS ix_time_entry_user_day"))
+    for index in TimeEntry.__table__.indexes:
+        if index.name == "ux_time_entry_user_day":
+            index.create(bind=conn, checkfirst=True)
+
+
+def _migrate_totals(conn):
+    DailyTotals.__table__.create(bind=conn, checkfirst=True)
+    WeeklyTotals.__table__.create(bind=conn, checkfirst=True)
+    rebuild_totals(conn)
+
+
+# Ordered (version, description, migration). Append new steps; never reorder.
+MIGRATIONS = [
+    (1, "baseline tables and legacy columns", _migrate_legacy_columns),
+    (2, "lookup indexes", _migrate_lookup_indexes),
+    (3, "cache version stamps", _migrate_cache_versions),
+    (4, "outbound email queue", _migrate_outbound_email),
+    (5, "daily and weekly totals", _migrate_totals),
+    (6, "activity log indexes", _migrate_activity_log_indexes),
+    (7, "api idempotency keys", _migrate_idempotency_keys),
+    (8, "unique time entry per user and day", _migrate_unique_time_entries),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+MIGRATION_LOCK_KEY = 0x54494D45  # arbitrary, shared by all workers
+
+
+def stored_schema_version(conn):
+    return conn.execute(select(func.max(SchemaVersion.version))).scalar() or 0
+
+
+def run_migrations():
+    """Apply pending migrations in order inside a single transaction.
+
+    The database-wide write lock (an advisory lock on PostgreSQL) is taken
+    up front so concurrent workers queue behind the first one instead of
+    racing on ALTER TABLE. Returns the versions that were applied.
+    """
+    applied = []
+    with db.engine.connect() as conn:
+        if conn.dialect.name == "sqlite":
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+        elif conn.dialect.name == "postgresql":
+            conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        if not inspect(conn).has_table(SchemaVersion.__tablename__):
+            SchemaVersion.__table__.create(bind=conn)
+        current = stored_schema_version(conn)
+        for version, description, migrate in MIGRATIONS:
+            if version <= current:
+                continue
+            migrate(conn)
+            conn.execute(SchemaVersion.__table__.insert().values(
+                version=version,
+                description=description,
+                applied_at=datetime.now()
+            ))
+            applied.append(version)
+        conn.commit()
+    return applied
+
+
+def schema_is_current():
+    try:
+        with db.engine.connect() as conn:
+            return stored_schema_version(conn) >= SCHEMA_VERSION
+    except (OperationalError, ProgrammingError):
+        return False
 
-def ensure_schema():
-    db.create_all()
 
-    def has_column(table, column):
-        rows = db.session.execute(text(f"PRAGMA table_info({table})")).fetchall()
-        return any(row[1] == column for row in rows)
+@app.cli.command("migrate")
+def migrate_command():
+    """Apply pending schema migrations."""
+    applied = run_migrations()
+    app.config["SCHEMA_READY"] = True
+    if applied:
+        print(f"✅ Applied migrations: {', '.join(str(v) for v in applied)}")
+    else:
+        print(f"✅ Schema already at version {SCHEMA_VERSION}")
 
-    def add_column(table, column_def):
-        db.session.execute(text(f"ALTER TABLE {table} ADD COLUMN {column_def}"))
 
-    if not has_column("time_entry", "shift_notes"):
-        add_column("time_entry", "shift_notes TEXT")
+@app.before_request
+def prepare_schema():
+    if not app.config.get("SCHEMA_READY"):
+        if not schema_is_current():
+            run_migrations()
+        app.config["SCHEMA_READY"] = True
+    mail_queue.ensure_started()
 
-    if not has_column("user", "phone"):
-        add_column("user", "phone TEXT")
 
-    if not has_column("user", "is_staff"):
-        add_column("user", "is_staff BOOLEAN DEFAULT 1")
+# ---------------- CACHES ----------------
+def read_cache_version(name):
+    return db.session.query(CacheVersion.version).filter_by(name=name).scalar() or 0
 
-    if not has_column("user", "position"):
-        add_column("user", "position TEXT")
 
-    if not has_column("user", "visa_type"):
-        add_column("user", "visa_type TEXT")
+def bump_cache_version(name):
+    """Bump a shared version stamp so other workers drop their cached copy.
 
-    if not has_column("user", "weekly_hour_limit"):
-        add_column("user", "weekly_hour_limit FLOAT")
+    Runs inside the caller's transaction; the caller commits.
+    """
+    updated = CacheVersion.query.filter_by(name=name).update(
+        {CacheVersion.version: CacheVersion.version + 1}
+    )
+    if not updated:
+        db.session.add(CacheVersion(name=name, version=1))
 
-    if not has_column("system_settings", "overtime_threshold_hours"):
-        add_column("system_settings", "overtime_threshold_hours FLOAT DEFAULT 40.0")
 
-    if not has_column("system_settings", "overtime_multiplier"):
-        add_column("system_settings", "overtime_multiplier FLOAT DEFAULT 1.5")
+class VersionedCache:
+    """Process-local cache of one value, validated against a CacheVersion stamp.
 
-    if not has_column("roster", "week_start"):
-        add_column("roster", "week_start DATE")
+    The stamp is re-read at most every CACHE_CHECK_SECONDS, so steady-state
+    hits cost no queries. Writers call bump_cache_version() in their
+    transaction and invalidate() after committing.
+    """
 
-    if not has_column("roster", "week_end"):
-        add_column("roster", "week_end DATE")
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+        self._lock = threading.Lock()
+        self._state = None  # (value, version, checked_at)
 
-    if not has_column("roster", "is_off"):
-        add_column("roster", "is_off BOOLEAN DEFAULT 0")
+    def get(self):
+        now = time.monotonic()
+        state = self._state
+        if state is not None and now - state[2] < app.config.get("CACHE_CHECK_SECONDS", 5):
+            return state[0]
 
-    if not has_column("roster", "notes"):
-        add_column("roster", "notes TEXT")
+        version = read_cache_version(self.name)
+        if state is not None and state[1] == version:
+            self._state = (state[0], version, now)
+            return state[0]
 
-    if not has_column("roster", "role_title"):
-        add_column("roster", "role_title TEXT")
+        with self._lock:
+            state = self._state
+            if state is not None and state[1] == version:
+                return state[0]
+            value = self.loader()
+            self._state = (value, version, now)
+        return value
 
-    db.session.commit()
+    def invalidate(self):
+        self._state = None
 
 
-@app.before_request
-def prepare_schema():
-    if not app.config.get("SCHEMA_READY"):
-        ensure_schema()
-        app.config["SCHEMA_READY"] = True
-
-
-def get_settings():
+def _load_settings():
     settings = SystemSettings.query.first()
     if not settings:
         settings = SystemSettings()
         db.session.add(settings)
         db.session.commit()
+        db.session.refresh(settings)
+    # Detach so the cached copy can outlive this request's session.
+    db.session.expunge(settings)
     return settings
 
 
+settings_cache = VersionedCache("settings", _load_settings)
+
+
+class UserCache:
+    """Process-local cache of detached User rows for load_user.
+
+    Every lookup re-reads the user's own "user:<id>" CacheVersion stamp (one
+    primary-key read) and only fetches the User row when the stamp moved, so
+    a deactivation or role change made by any worker applies on the very
+    next request. Code that changes a user calls user_changed() before
+    committing and user_cache.invalidate() after.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # id -> (user, version)
+
+    def get(self, user_id):
+        entry = self._entries.get(user_id)
+        version = read_cache_version(f"user:{user_id}")
+        if entry is not None and entry[1] == version:
+            self._store(user_id, entry)
+            return entry[0]
+
+        user = db.session.get(User, user_id)
+        if user is None:
+            self.invalidate(user_id)
+            return None
+        # Detach so the cached copy can outlive this request's session.
+        db.session.expunge(user)
+        self._store(user_id, (user, version))
+        return user
+
+    def _store(self, user_id, entry):
+        with self._lock:
+            self._entries[user_id] = entry
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > app.config.get("USER_CACHE_SIZE", 1000):
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache()
+
+
+class UserRecord:
+    """Compact read-only copy of a user for name lookups in views."""
+
+    __slots__ = ("id", "name", "employee_id", "department", "position",
+                 "role", "is_admin", "is_active", "is_staff")
+
+    def __init__(self, *values):
+        for slot, value in zip(self.__slots__, values):
+            setattr(self, slot, value)
+
+
+class UserDirectory(dict):
+    """{user_id: UserRecord}, plus the lists pages build from it.
+
+    The lists are computed once per load of the directory, not on every
+    request, and go away with it when a user changes.
+    """
+
+    @cached_property
+    def choices(self):
+        """(id, name) pairs for user filter dropdowns, by name."""
+        return [(u.id, u.name) for u in sorted(self.values(), key=lambda u: (u.name or "").lower())]
+
+    @cached_property
+    def departments(self):
+        return sorted({u.department for u in self.values() if u.department})
+
+
+def _load_user_directory():
+    columns = [getattr(User, slot) for slot in UserRecord.__slots__]
+    return UserDirectory(
+        (row[0], UserRecord(*row))
+        for row in db.session.query(*columns).order_by(User.id)
+    )
+
+
+# UserDirectory shared by every view that shows names.
+user_directory = VersionedCache("users", _load_user_directory)
+
+
+def get_user_directory():
+    return user_directory.get()
+
+
+def user_changed(user_id=None, directory=True):
+    """Mark a user (or just the directory) as changed; caller commits.
+
+    Pass directory=False when none of the UserRecord fields changed (a new
+    password, email, phone or picture): the directory and the reports built
+    from it then stay cached.
+    """
+    if user_id is not None:
+        bump_cache_version(f"user:{user_id}")
+    if directory:
+        bump_cache_version("users")
+
+
+def invalidate_user(user_id=None, directory=True):
+    """Drop this worker's cached copies after a user_changed() commit."""
+    if user_id is not None:
+        user_cache.invalidate(user_id)
+    if directory:
+        user_directory.invalidate()
+        report_cache.clear()
+
+
+class ReportCache:
+    """LRU of computed report rows keyed by (type, start, end, filters).
+
+    Commits that change totals drop the entries whose range covers a changed
+    day straight away (see refresh_totals). Changes made by other workers
+    are caught by re-checking an entry's stamp (the "users" version plus the
+    newest daily_totals.updated_at and row count in its range) at most every
+    CACHE_CHECK_SECONDS.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> [rows, start, end, stamp, checked_at]
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _stamp(start, end):
+        last_update, row_count = db.session.query(
+            func.max(DailyTotals.updated_at), func.count()
+        ).filter(DailyTotals.day >= start, DailyTotals.day <= end).one()
+        return read_cache_version("users"), last_update, row_count
+
+    def get(self, key, start, end, compute):
+        """Cached rows for key, or compute() them and cache the result."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and now - entry[4] < app.config.get("CACHE_CHECK_SECONDS", 5):
+            return self._hit(key, entry)
+
+        stamp = self._stamp(start, end)
+        if entry is not None and entry[3] == stamp:
+            entry[4] = now
+            return self._hit(key, entry)
+
+        rows = compute()
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = [rows, start, end, stamp, now]
+            self._entries.move_to_end(key)
+            while len(self._entries) > app.config.get("REPORT_CACHE_SIZE", 64):
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return rows
+
+    def _hit(self, key, entry):
+        with self._lock:
+            self.hits += 1
+            if key in self._entries:
+                self._entries.move_to_end(key)
+        return entry[0]
+
+    def invalidate_days(self, days):
+        """Drop every entry whose date range includes one of days."""
+        days = sorted(days)
+        if not days:
+            return
+        with self._lock:
+            stale = [
+                key for key, (_, start, end, _, _) in self._entries.items()
+                if any(start <= day <= end for day in days)
+            ]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": app.config.get("REPORT_CACHE_SIZE", 64),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "invalidations": self.invalidations,
+                "evictions": self.evictions,
+            }
+
+
+report_cache = ReportCache()
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_reports(session):
+    days = session.info.pop("totals_days", None)
+    if days:
+        report_cache.invalidate_days(days)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_report_days(session):
+    session.info.pop("totals_days", None)
+
+
+def get_settings():
+    return settings_cache.get()
+
+
 def is_week_locked(user_id, day):
     w_start, w_end = get_week_range(day)
     lock = WeekApproval.query.filter_by(
@@ -389,17 +1202,268 @@ def is_week_locked(user_id, day):
     return bool(lock)
 
 
-def work_and_break_minutes(entry):
-    break_mins = minutes(entry.lunch_start, entry.lunch_end) + minutes(entry.dinner_start, entry.dinner_end)
-    work_mins = minutes(entry.clock_in, entry.clock_out) - break_mins
-    if work_mins < 0:
-        work_mins = 0
-    return work_mins, break_mins
+def locked_weeks(pairs):
+    """The subset of (user_id, week_start) pairs whose week is locked, in one query."""
+    pairs = set(pairs)
+    if not pairs:
+        return set()
+    rows = db.session.query(WeekApproval.user_id, WeekApproval.week_start).filter(
+        WeekApproval.user_id.in_({user_id for user_id, _ in pairs}),
+        WeekApproval.week_start.in_({week_start for _, week_start in pairs}),
+        WeekApproval.locked == True
+    )
+    return {(user_id, week_start) for user_id, week_start in rows} & pairs
+
+
+def time_columns():
+    """TimeEntry timestamp columns for bulk reads, in TIME_FIELDS order.
+
+    With NumPy available they are read as the raw stored text, which the
+    batch kernel parses much faster than it converts datetime objects.
+    """
+    columns = [getattr(TimeEntry, field) for field in TIME_FIELDS]
+    if HAVE_NUMPY:
+        columns = [type_coerce(col, db.String).label(col.key) for col in columns]
+    return columns
+
+
+def summarize_hours(user_ids, start, end):
+    """Total work/break minutes and week lock status for many users at once.
+
+    One grouped query over the daily rollups plus one lock query, instead of
+    a query per user. Returns {user_id: {"work", "break", "locked"}}.
+    """
+    user_ids = list(user_ids)
+    summary = {uid: {"work": 0, "break": 0, "locked": False} for uid in user_ids}
+    if not user_ids:
+        return summary
+
+    rows = db.session.query(
+        DailyTotals.user_id,
+        func.sum(DailyTotals.work_minutes),
+        func.sum(DailyTotals.break_minutes)
+    ).filter(
+        DailyTotals.user_id.in_(user_ids),
+        DailyTotals.day >= start,
+        DailyTotals.day <= end
+    ).group_by(DailyTotals.user_id).all()
+
+    for uid, work_mins, break_mins in rows:
+        summary[uid]["work"] = work_mins or 0
+        summary[uid]["break"] = break_mins or 0
+
+    w_start, w_end = get_week_range(start)
+    locked_ids = db.session.query(WeekApproval.user_id).filter(
+        WeekApproval.user_id.in_(user_ids),
+        WeekApproval.week_start == w_start,
+        WeekApproval.week_end == w_end,
+        WeekApproval.locked == True
+    ).all()
+    for (uid,) in locked_ids:
+        summary[uid]["locked"] = True
+
+    return summary
+
+
+# ---------------- TOTALS ----------------
+def dialect_insert(model):
+    """INSERT supporting on_conflict_do_* for the configured database."""
+    if db.session.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+        return pg_insert(model)
+    from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+    return sqlite_insert(model)
+
+
+def _upsert_totals(model, keys, rows):
+    if not rows:
+        return
+    stmt = dialect_insert(model).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=keys,
+        set_={
+            col: stmt.excluded[col]
+            for col in ("work_minutes", "break_minutes", "overtime_minutes", "updated_at")
+        }
+    )
+    db.session.execute(stmt)
 
 
-def daily_overtime_minutes(work_mins, settings):
+def refresh_totals(user_id, days):
+    """Recompute the daily and weekly rollups for one user's changed days.
+
+    Call after changing TimeEntry rows and before committing, so the rollups
+    are written in the same transaction. Days without a clock-in are kept as
+    zero rows rather than deleted, so their updated_at still moves.
+    """
+    days = sorted(set(days))
+    if not days:
+        return
+    settings = get_settings()
+    now = datetime.now()
+    # Cached reports covering these days are dropped once this commits.
+    db.session.info.setdefault("totals_days", set()).update(days)
+
+    rows = db.session.query(TimeEntry.day, *time_columns()).filter(
+        TimeEntry.user_id == user_id,
+        TimeEntry.day.in_(days),
+        TimeEntry.clock_in.isnot(None)
+    ).all()
+    per_day = {day: (0, 0) for day in days}
+    work, breaks, _ = entry_minutes(row[1:] for row in rows)
+    for row, work_mins, break_mins in zip(rows, work, breaks):
+        day_work, day_break = per_day[row.day]
+        per_day[row.day] = (day_work + work_mins, day_break + break_mins)
+
     daily_threshold = int(settings.working_hours_per_day * 60)
-    return max(0, work_mins - daily_threshold)
+    _upsert_totals(DailyTotals, ["user_id", "day"], [
+        {
+            "user_id": user_id,
+            "day": day,
+            "work_minutes": day_work,
+            "break_minutes": day_break,
+            "overtime_minutes": max(0, day_work - daily_threshold),
+            "updated_at": now,
+        }
+        for day, (day_work, day_break) in per_day.items()
+    ])
+
+    weekly_threshold = int(settings.overtime_threshold_hours * 60)
+    weekly_rows = []
+    for w_start in sorted({get_week_range(day)[0] for day in days}):
+        week_work, week_break = db.session.query(
+            func.coalesce(func.sum(DailyTotals.work_minutes), 0),
+            func.coalesce(func.sum(DailyTotals.break_minutes), 0)
+        ).filter(
+            DailyTotals.user_id == user_id,
+            DailyTotals.day >= w_start,
+            DailyTotals.day <= w_start + timedelta(days=6)
+        ).one()
+        weekly_rows.append({
+            "user_id": user_id,
+            "week_start": w_start,
+            "work_minutes": week_work,
+            "break_minutes": week_break,
+            "overtime_minutes": max(0, week_work - weekly_threshold),
+            "updated_at": now,
+        })
+    _upsert_totals(WeeklyTotals, ["user_id", "week_start"], weekly_rows)
+
+
+def refresh_weekly_overtime(settings):
+    """Re-derive weekly overtime after the overtime threshold changes."""
+    threshold = int(settings.overtime_threshold_hours * 60)
+    WeeklyTotals.query.update({
+        WeeklyTotals.overtime_minutes: case(
+            (WeeklyTotals.work_minutes > threshold, WeeklyTotals.work_minutes - threshold),
+            else_=0
+        ),
+        WeeklyTotals.updated_at: datetime.now()
+    }, synchronize_session=False)
+
+
+def compute_totals(conn):
+    """Daily and weekly rollups recomputed from every TimeEntry row.
+
+    Returns ({(user_id, day): row}, {(user_id, week_start): row}).
+    """
+    settings = conn.execute(select(
+        SystemSettings.working_hours_per_day, SystemSettings.overtime_threshold_hours
+    ).limit(1)).first()
+    daily_threshold = int((settings[0] if settings else 8.0) * 60)
+    weekly_threshold = int((settings[1] if settings else 40.0) * 60)
+
+    daily = {}
+    # On the statement, not the caller's connection, so the option doesn't
+    # outlive this query.
+    result = conn.execute(
+        select(TimeEntry.user_id, TimeEntry.day, *time_columns())
+        .where(TimeEntry.clock_in.isnot(None))
+        .execution_options(yield_per=5000)
+    )
+    for chunk in result.partitions():
+        work, breaks, _ = entry_minutes(row[2:] for row in chunk)
+        for row, work_mins, break_mins in zip(chunk, work, breaks):
+            day_work, day_break = daily.get((row.user_id, row.day), (0, 0))
+            daily[(row.user_id, row.day)] = (day_work + work_mins, day_break + break_mins)
+
+    weekly = {}
+    for (user_id, day), (day_work, day_break) in daily.items():
+        key = (user_id, get_week_range(day)[0])
+        week_work, week_break = weekly.get(key, (0, 0))
+        weekly[key] = (week_work + day_work, week_break + day_break)
+
+    daily_rows = {
+        key: {"work_minutes": w, "break_minutes": b, "overtime_minutes": max(0, w - daily_threshold)}
+        for key, (w, b) in daily.items()
+    }
+    weekly_rows = {
+        key: {"work_minutes": w, "break_minutes": b, "overtime_minutes": max(0, w - weekly_threshold)}
+        for key, (w, b) in weekly.items()
+    }
+    return daily_rows, weekly_rows
+
+
+def rebuild_totals(conn):
+    """Replace both rollup tables with values recomputed from TimeEntry."""
+    daily, weekly = compute_totals(conn)
+    now = datetime.now()
+    conn.execute(DailyTotals.__table__.delete())
+    conn.execute(WeeklyTotals.__table__.delete())
+    daily_rows = [dict(row, user_id=uid, day=day, updated_at=now) for (uid, day), row in daily.items()]
+    weekly_rows = [dict(row, user_id=uid, week_start=ws, updated_at=now) for (uid, ws), row in weekly.items()]
+    for i in range(0, len(daily_rows), 5000):
+        conn.execute(DailyTotals.__table__.insert(), daily_rows[i:i + 5000])
+    for i in range(0, len(weekly_rows), 5000):
+        conn.execute(WeeklyTotals.__table__.insert(), weekly_rows[i:i + 5000])
+    return len(daily_rows), len(weekly_rows)
+
+
+def check_totals(conn):
+    """Compare stored rollups with recomputed ones; returns a list of problems."""
+    problems = []
+    for model, key_col, expected in zip(
+        (DailyTotals, WeeklyTotals), ("day", "week_start"), compute_totals(conn)
+    ):
+        stored = {
+            (row.user_id, row[1]): {
+                "work_minutes": row.work_minutes,
+                "break_minutes": row.break_minutes,
+                "overtime_minutes": row.overtime_minutes,
+            }
+            for row in conn.execute(select(
+                model.user_id, getattr(model, key_col), model.work_minutes,
+                model.break_minutes, model.overtime_minutes
+            ))
+        }
+        zero = {"work_minutes": 0, "break_minutes": 0, "overtime_minutes": 0}
+        for key in sorted(set(stored) | set(expected)):
+            have = stored.get(key)
+            want = expected.get(key, zero)
+            if have != want and not (have is None and want == zero):
+                problems.append(f"{model.__tablename__} user {key[0]} {key[1]}: stored {have}, expected {want}")
+    return problems
+
+
+@app.cli.command("rebuild-totals")
+def rebuild_totals_command():
+    """Recompute the daily/weekly totals tables from time entries."""
+    with db.engine.begin() as conn:
+        daily_count, weekly_count = rebuild_totals(conn)
+    print(f"✅ Rebuilt {daily_count} daily and {weekly_count} weekly totals")
+
+
+@app.cli.command("check-totals")
+def check_totals_command():
+    """Verify the daily/weekly totals tables against time entries."""
+    with db.engine.connect() as conn:
+        problems = check_totals(conn)
+    for problem in problems[:50]:
+        print(f"❌ {problem}")
+    if problems:
+        print(f"❌ {len(problems)} mismatched totals; run 'flask --app app rebuild-totals'")
+        raise SystemExit(1)
+    print("✅ Totals are consistent")
 
 
 def validate_entry_time_order(entry):
@@ -446,7 +1510,9 @@ def seed_demo_data():
                 is_active=True
             )
             db.session.add(u)
+        user_changed()
         db.session.commit()
+        invalidate_user()
 
 
 # ---------------- ROUTES ----------------
@@ -463,7 +1529,7 @@ def init():
         if not init_token or token != init_token:
             return "Unauthorized", 403
 
-    db.create_all()
+    run_migrations()
 
     seed_demo_data()
 
@@ -496,11 +1562,13 @@ def login():
             if not User.query.filter((User.role == "admin") | (User.is_admin == True)).first():
                 user.role = "admin"
                 user.is_admin = True
+                user_changed(user.id)
                 log_activity("ADMIN_BOOTSTRAP", f"{user.name} promoted to admin (no admins found)")
                 flash("✅ Admin access restored for this account.", "success")
             user.last_login = datetime.now()
+            log_activity(f"LOGIN", f"User {user.name} logged in", buffered=True)
             db.session.commit()
-            log_activity(f"LOGIN", f"User {user.name} logged in")
+            user_cache.invalidate(user.id)
             return redirect("/dashboard")
         else:
             flash("❌ Invalid username/email or password", "danger")
@@ -516,7 +1584,8 @@ def login():
 @app.route("/logout")
 @login_required
 def logout():
-    log_activity("LOGOUT", f"User {current_user.name} logged out")
+    log_activity("LOGOUT", f"User {current_user.name} logged out", buffered=True)
+    db.session.commit()
     logout_user()
     flash("✅ You have been logged out", "success")
     return redirect("/login")
@@ -528,6 +1597,8 @@ def settings():
     """User settings page - change password, username, profile picture"""
     if request.method == "POST":
         action = request.form.get("action")
+        # current_user is a cached, detached copy; change the session's row.
+        user = db.session.get(User, current_user.id)
         
         # Change Password
         if action == "change_password":
@@ -542,8 +1613,10 @@ def settings():
             elif len(new_pwd) < 6:
                 flash("❌ Password must be at least 6 characters", "danger")
             else:
-                current_user.password = generate_password_hash(new_pwd)
+                user.password = generate_password_hash(new_pwd)
+                user_changed(user.id, directory=False)
                 db.session.commit()
+                invalidate_user(user.id, directory=False)
                 flash("✅ Password changed successfully!", "success")
                 return redirect("/settings")
         
@@ -556,24 +1629,30 @@ def settings():
             elif User.query.filter_by(name=new_name).first() and new_name != current_user.name:
                 flash("❌ Username already taken", "danger")
             else:
-                current_user.name = new_name
+                user.name = new_name
+                user_changed(user.id)
                 db.session.commit()
+                invalidate_user(user.id)
                 flash("✅ Username changed successfully!", "success")
                 return redirect("/settings")
         
         # Update Email
         elif action == "update_email":
             email = request.form.get("email")
-            current_user.email = email
+            user.email = email
+            user_changed(user.id, directory=False)
             db.session.commit()
+            invalidate_user(user.id, directory=False)
             flash("✅ Email updated successfully!", "success")
             return redirect("/settings")
 
         # Update Phone
         elif action == "update_phone":
             phone = normalize_phone(request.form.get("phone"))
-            current_user.phone = phone
+            user.phone = phone
+            user_changed(user.id, directory=False)
             db.session.commit()
+            invalidate_user(user.id, directory=False)
             flash("✅ Phone updated successfully!", "success")
             return redirect("/settings")
         
@@ -595,8 +1674,10 @@ def settings():
                 ):
                     filename = secure_filename(f"user_{current_user.id}_{datetime.now().timestamp()}.{file.filename.rsplit('.', 1)[1].lower()}")
                     file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                    current_user.profile_pic = filename
+                    user.profile_pic = filename
+                    user_changed(user.id, directory=False)
                     db.session.commit()
+                    invalidate_user(user.id, directory=False)
                     flash("✅ Profile picture updated!", "success")
                     return redirect("/settings")
                 else:
@@ -617,8 +1698,9 @@ def reset_entry(entry_id):
         entry.dinner_start = None
         entry.dinner_end = None
         entry.clock_out = None
-        db.session.commit()
+        refresh_totals(entry.user_id, [entry.day])
         log_activity("ENTRY_RESET", f"Entry for {entry.day} reset")
+        db.session.commit()
         flash("✅ Entry reset successfully!", "success")
     else:
         flash("❌ Access denied", "danger")
@@ -628,37 +1710,83 @@ def reset_entry(entry_id):
     return redirect("/dashboard")
 
 
+def conditional_page(etag, render):
+    """Answer 304 when the client already has the page tagged etag.
+
+    render() is only called on a miss. Pages with flash messages waiting are
+    always rendered and never tagged, so each message is shown exactly once.
+    """
+    if session.get("_flashes"):
+        response = make_response(render())
+        response.headers["Cache-Control"] = "no-store"
+        return response
+    return conditional_response(etag, render)
+
+
+def conditional_response(etag, render):
+    """conditional_page for JSON, which never shows flash messages."""
+    if etag in request.if_none_match:
+        response = app.response_class(status=304)
+    else:
+        response = make_response(render())
+    response.set_etag(etag)
+    # Per user, and always revalidated: punches must show up immediately.
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def dashboard_etag(entry, *parts):
+    """Fingerprint of what the current user's dashboard shows."""
+    # role and is_admin decide whether base.html draws the Admin nav link.
+    state = (
+        current_user.id, current_user.name, current_user.department,
+        current_user.role, current_user.is_admin, entry.day,
+        entry_times(entry), entry.status, entry.shift_notes
+    ) + parts
+    return hashlib.sha1(repr(state).encode()).hexdigest()
+
+
+def today_panel_context(entry):
+    (work_minutes,), (break_minutes,), _ = entry_minutes([entry_times(entry)])
+    return {"entry": entry, "work_minutes": work_minutes, "break_minutes": break_minutes}
+
+
 @app.route("/dashboard")
 @login_required
 def dashboard():
-    entry = get_today_entry()
+    # Nothing is stored until the first punch; render a blank entry until then.
+    entry = get_today_entry(create=False) or TimeEntry(user_id=current_user.id, day=date.today())
     settings = get_settings()
+    etag = dashboard_etag(entry, read_cache_version("roster"), settings.dinner_break_duration)
 
-    break_minutes = (
-        minutes(entry.lunch_start, entry.lunch_end)
-        + minutes(entry.dinner_start, entry.dinner_end)
-    )
+    def render():
+        week_start, _ = get_week_range()
+        roster = Roster.query.filter(
+            Roster.user_id == current_user.id,
+            (Roster.week_start == week_start) | (Roster.week_start.is_(None))
+        ).all()
+        day_order = {d: i for i, d in enumerate(['Monday','Tuesday','Wednesday','Thursday','Friday','Saturday','Sunday'])}
+        roster = sorted(roster, key=lambda r: day_order.get(r.day_of_week, 99))
+
+        return render_template(
+            "dashboard.html",
+            format_time=format_time,
+            roster=roster,
+            settings=settings,
+            **today_panel_context(entry)
+        )
 
-    work_minutes = minutes(entry.clock_in, entry.clock_out) - break_minutes
-    if work_minutes < 0:
-        work_minutes = 0
+    return conditional_page(etag, render)
 
-    week_start, _ = get_week_range()
-    roster = Roster.query.filter(
-        Roster.user_id == current_user.id,
-        (Roster.week_start == week_start) | (Roster.week_start.is_(None))
-    ).all()
-    day_order = {d: i for i, d in enumerate(['Monday','Tuesday','Wednesday','Thursday','Friday','Saturday','Sunday'])}
-    roster = sorted(roster, key=lambda r: day_order.get(r.day_of_week, 99))
 
-    return render_template(
-        "dashboard.html",
-        entry=entry,
-        work_minutes=work_minutes,
-        break_minutes=break_minutes,
-        format_time=format_time,
-        roster=roster,
-        settings=settings
+@app.route("/dashboard/today")
+@login_required
+def dashboard_today():
+    """Just the Today panel, for the dashboard's periodic refresh."""
+    entry = get_today_entry(create=False) or TimeEntry(user_id=current_user.id, day=date.today())
+    return conditional_page(
+        dashboard_etag(entry, "today"),
+        lambda: render_template("dashboard_today.html", **today_panel_context(entry))
     )
 
 
@@ -670,32 +1798,25 @@ def week_view():
     entries = TimeEntry.query.filter(
         TimeEntry.user_id == current_user.id,
         TimeEntry.day >= w_start,
-        TimeEntry.day <= w_end
+        TimeEntry.day <= w_end,
+        TimeEntry.clock_in.isnot(None)
     ).all()
     
     rows = []
-    weekly_work = 0
-    weekly_break = 0
+    work, breaks, _ = entry_minutes(entry_times(e) for e in entries)
+    weekly_work = sum(work)
+    weekly_break = sum(breaks)
     
-    for entry in entries:
-        if entry.clock_in:
-            break_mins = minutes(entry.lunch_start, entry.lunch_end) + minutes(entry.dinner_start, entry.dinner_end)
-            work_mins = minutes(entry.clock_in, entry.clock_out) - break_mins
-            if work_mins < 0:
-                work_mins = 0
-            
-            weekly_work += work_mins
-            weekly_break += break_mins
-            
-            rows.append({
-                'date': entry.day.strftime("%a, %d/%m"),
-                'clock_in': format_time(entry.clock_in),
-                'lunch': f"{format_time(entry.lunch_start)} - {format_time(entry.lunch_end)}",
-                'dinner': f"{format_time(entry.dinner_start)} - {format_time(entry.dinner_end)}",
-                'clock_out': format_time(entry.clock_out),
-                'breaks': break_mins,
-                'worked': work_mins
-            })
+    for entry, work_mins, break_mins in zip(entries, work, breaks):
+        rows.append({
+            'date': entry.day.strftime("%a, %d/%m"),
+            'clock_in': format_time(entry.clock_in),
+            'lunch': f"{format_time(entry.lunch_start)} - {format_time(entry.lunch_end)}",
+            'dinner': f"{format_time(entry.dinner_start)} - {format_time(entry.dinner_end)}",
+            'clock_out': format_time(entry.clock_out),
+            'breaks': break_mins,
+            'worked': work_mins
+        })
     
     weekly_work_hours = weekly_work / 60
     remaining = max(0, 48 - weekly_work_hours)
@@ -745,14 +1866,7 @@ def admin():
                 flash("❌ This week is locked. Unlock to edit.", "danger")
                 return redirect("/admin")
 
-            entry = TimeEntry.query.filter_by(
-                user_id=user.id,
-                day=entry_day
-            ).first()
-            
-            if not entry:
-                entry = TimeEntry(user_id=user.id, day=entry_day)
-                db.session.add(entry)
+            entry = get_or_create_entry(user.id, entry_day)
             
             # Parse times
             if request.form.get("clock_in"):
@@ -786,8 +1900,9 @@ def admin():
                     flash(msg, "danger")
                 return redirect("/admin")
 
-            db.session.commit()
+            refresh_totals(user.id, [entry_day])
             log_activity("ENTRY_EDITED", f"{user.name} - {entry_day}")
+            db.session.commit()
             flash("✅ Entry updated successfully!", "success")
         
         # Delete user
@@ -797,8 +1912,12 @@ def admin():
             if user and (user.role != 'admin' and not user.is_admin):  # Can't delete admin
                 TimeEntry.query.filter_by(user_id=user.id).delete()
                 Roster.query.filter_by(user_id=user.id).delete()
+                DailyTotals.query.filter_by(user_id=user.id).delete()
+                WeeklyTotals.query.filter_by(user_id=user.id).delete()
+                user_changed(user.id)
                 db.session.delete(user)
                 db.session.commit()
+                invalidate_user(user.id)
                 flash(f"✅ User {user.name} deleted", "success")
             elif user and (user.role == 'admin' or user.is_admin):
                 flash("❌ Cannot delete admin account", "danger")
@@ -812,6 +1931,7 @@ def admin():
                 TimeEntry.day >= w_start,
                 TimeEntry.day <= w_end
             ).delete()
+            refresh_totals(int(user_id), [w_start + timedelta(days=i) for i in range(7)])
             db.session.commit()
             flash("✅ Week reset for user", "success")
         
@@ -845,6 +1965,7 @@ def admin():
             roster.is_off = False
             roster.notes = None
             roster.role_title = user.position if user else None
+            bump_cache_version("roster")
             db.session.commit()
             flash("✅ Roster updated", "success")
 
@@ -862,15 +1983,22 @@ def admin():
                 else:
                     roster = Roster(user_id=emp.id, day_of_week=day_of_week, start_time=start_time, end_time=end_time)
                     db.session.add(roster)
+            bump_cache_version("roster")
             db.session.commit()
             flash("✅ Roster updated for all employees", "success")
 
         elif action == "update_overtime":
-            settings = get_settings()
+            settings = SystemSettings.query.first()
+            if not settings:
+                settings = SystemSettings()
+                db.session.add(settings)
             settings.overtime_threshold_hours = float(request.form.get("overtime_threshold", 40))
             settings.overtime_multiplier = float(request.form.get("overtime_multiplier", 1.5))
-            db.session.commit()
+            bump_cache_version("settings")
+            refresh_weekly_overtime(settings)
             log_activity("OVERTIME_RULES_UPDATED", "Overtime rules updated")
+            db.session.commit()
+            settings_cache.invalidate()
             flash("✅ Overtime rules updated", "success")
 
         elif action == "rebuild_db":
@@ -880,10 +2008,15 @@ def admin():
                 flash("❌ Rebuild not confirmed. Check the box and type REBUILD.", "danger")
                 return redirect("/admin")
             db.drop_all()
-            db.create_all()
+            run_migrations()
             seed_demo_data()
+            settings_cache.invalidate()
+            user_cache.clear()
+            user_directory.invalidate()
+            report_cache.clear()
             app.config["SCHEMA_READY"] = True
             log_activity("DB_REBUILT", "Database rebuilt by admin")
+            db.session.commit()
             logout_user()
             flash("✅ Database rebuilt. Please log in again.", "success")
             return redirect("/login")
@@ -892,38 +2025,26 @@ def admin():
     
     # Get all users' weekly summaries
     w_start, w_end = get_week_range()
-    users = User.query.all()
+    user_map = get_user_directory()
+    users = list(user_map.values())
     summaries = []
     roster_entries = Roster.query.all()
-    user_map = {u.id: u for u in users}
     
     settings = get_settings()
+    totals = summarize_hours(user_map.keys(), w_start, w_end)
 
     for user in users:
-        entries = TimeEntry.query.filter(
-            TimeEntry.user_id == user.id,
-            TimeEntry.day >= w_start,
-            TimeEntry.day <= w_end
-        ).all()
-        
-        total_work = 0
-        total_break = 0
-        for entry in entries:
-            if entry.clock_in:
-                work, breaks = work_and_break_minutes(entry)
-                total_work += work
-                total_break += breaks
-        
-        work_hours = total_work / 60
+        user_totals = totals[user.id]
+        work_hours = user_totals["work"] / 60
         flag = "✓" if work_hours >= settings.weekly_target_hours else f"⚠ {settings.weekly_target_hours - work_hours:.1f}h"
-        
+
         summaries.append({
             'id': user.id,
             'name': user.name,
             'work': f"{work_hours:.1f}h",
-            'breaks': f"{total_break/60:.1f}h",
+            'breaks': f"{user_totals['break']/60:.1f}h",
             'flag': flag,
-            'locked': is_week_locked(user.id, w_start)
+            'locked': user_totals["locked"]
         })
     
     days_of_week = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
@@ -954,25 +2075,22 @@ def calendar():
     else:
         last_day = date(year, month + 1, 1) - timedelta(days=1)
     
-    entries = TimeEntry.query.filter(
+    entries = db.session.query(TimeEntry.day, TimeEntry.status, *time_columns()).filter(
         TimeEntry.user_id == current_user.id,
         TimeEntry.day >= first_day,
-        TimeEntry.day <= last_day
+        TimeEntry.day <= last_day,
+        TimeEntry.clock_in.isnot(None)
     ).all()
     
     # Create calendar dict
     calendar_data = {}
-    for entry in entries:
-        if entry.clock_in:
-            break_mins = minutes(entry.lunch_start, entry.lunch_end) + minutes(entry.dinner_start, entry.dinner_end)
-            work_mins = minutes(entry.clock_in, entry.clock_out) - break_mins
-            if work_mins < 0:
-                work_mins = 0
-            calendar_data[entry.day.isoformat()] = {
-                'work_minutes': work_mins,
-                'break_minutes': break_mins,
-                'status': entry.status
-            }
+    work, breaks, _ = entry_minutes(entry[2:] for entry in entries)
+    for entry, work_mins, break_mins in zip(entries, work, breaks):
+        calendar_data[entry.day.isoformat()] = {
+            'work_minutes': work_mins,
+            'break_minutes': break_mins,
+            'status': entry.status
+        }
     
     return render_template("calendar.html", 
         month=month, year=year, 
@@ -981,6 +2099,84 @@ def calendar():
     )
 
 
+def calendar_scope(args):
+    """The DailyTotals filter for /api/calendar's user= or dept= argument."""
+    if args.get("dept"):
+        department = args["dept"].strip()
+        members = select(User.id).where(User.department == department)
+        return {"department": department}, DailyTotals.user_id.in_(members)
+    user_id = int(args.get("user") or current_user.id)
+    return {"user": user_id}, DailyTotals.user_id == user_id
+
+
+@app.route("/api/calendar")
+@login_required
+def api_calendar():
+    """Per-day work, break and overtime minutes for a user or a department.
+
+    ?from=YYYY-MM-DD&to=YYYY-MM-DD (default: this month, at most a year)
+    and user=<id> or dept=<name> (default: yourself; anyone else is admin
+    only). Read from the daily rollups with one grouped query. The ETag
+    comes from the rows' updated_at, which refresh_totals moves whenever an
+    entry in the range changes, so unchanged ranges revalidate with a 304.
+    """
+    today = date.today()
+    try:
+        start = date.fromisoformat(request.args["from"]) if request.args.get("from") else today.replace(day=1)
+        end = date.fromisoformat(request.args["to"]) if request.args.get("to") else (
+            (start.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+        )
+        scope, condition = calendar_scope(request.args)
+    except ValueError:
+        return jsonify({"error": "Invalid from, to or user"}), 400
+    if end < start or (end - start).days > 366:
+        return jsonify({"error": "to must be on or after from, at most a year later"}), 400
+    if scope.get("user") != current_user.id and current_user.role != 'admin' and not current_user.is_admin:
+        return jsonify({"error": "Access denied"}), 403
+
+    in_range = and_(condition, DailyTotals.day >= start, DailyTotals.day <= end)
+    last_update, row_count = db.session.query(
+        func.max(DailyTotals.updated_at), func.count()
+    ).filter(in_range).one()
+    # Department membership lives on the user rows, so it versions with them.
+    members_version = read_cache_version("users") if "department" in scope else 0
+    etag = hashlib.sha1(repr((
+        sorted(scope.items()), start, end, last_update, row_count, members_version
+    )).encode()).hexdigest()
+
+    def render():
+        rows = db.session.query(
+            DailyTotals.day,
+            func.sum(DailyTotals.work_minutes),
+            func.sum(DailyTotals.break_minutes),
+            func.sum(DailyTotals.overtime_minutes),
+            func.count(case((DailyTotals.work_minutes > 0, 1)))
+        ).filter(in_range).group_by(DailyTotals.day).order_by(DailyTotals.day)
+        days = [
+            {
+                "day": day.isoformat(),
+                "work_minutes": int(work),
+                "break_minutes": int(breaks),
+                "overtime_minutes": int(overtime),
+                "people": people,
+            }
+            for day, work, breaks, overtime, people in rows
+            if work or breaks
+        ]
+        return jsonify({
+            "from": start.isoformat(),
+            "to": end.isoformat(),
+            **scope,
+            "days": days,
+            "totals": {
+                field: sum(row[field] for row in days)
+                for field in ("work_minutes", "break_minutes", "overtime_minutes")
+            },
+        })
+
+    return conditional_response(etag, render)
+
+
 @app.route("/roster")
 @login_required
 def roster_view():
@@ -990,7 +2186,7 @@ def roster_view():
         (Roster.week_start == week_start) | (Roster.week_start.is_(None))
     ).all()
     day_order = {d: i for i, d in enumerate(['Monday','Tuesday','Wednesday','Thursday','Friday','Saturday','Sunday'])}
-    users = {u.id: u for u in User.query.all()}
+    users = get_user_directory()
     roster_entries = sorted(roster_entries, key=lambda r: day_order.get(r.day_of_week, 99))
     return render_template(
         "roster.html",
@@ -1019,39 +2215,45 @@ def roster_admin():
     days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
 
     if request.method == "POST":
+        existing = {
+            (r.user_id, r.day_of_week): r
+            for r in db.session.query(
+                Roster.id, Roster.user_id, Roster.day_of_week, Roster.start_time,
+                Roster.end_time, Roster.is_off, Roster.notes, Roster.role_title
+            ).filter(Roster.week_start == week_start)
+        }
+        inserts = []
+        updates = []
         for user in staff_users:
             for day in days:
-                start_key = f"start_{user.id}_{day}"
-                end_key = f"end_{user.id}_{day}"
-                off_key = f"off_{user.id}_{day}"
-                notes_key = f"notes_{user.id}_{day}"
-
-                start_time = request.form.get(start_key)
-                end_time = request.form.get(end_key)
-                is_off = request.form.get(off_key) == "1"
-                notes = request.form.get(notes_key)
-
-                roster = Roster.query.filter_by(
-                    user_id=user.id,
-                    day_of_week=day,
-                    week_start=week_start
-                ).first()
-
-                if not roster:
-                    roster = Roster(
-                        user_id=user.id,
-                        day_of_week=day,
-                        week_start=week_start,
-                        week_end=week_end
-                    )
-                    db.session.add(roster)
-
-                roster.is_off = is_off
-                roster.start_time = None if is_off else start_time
-                roster.end_time = None if is_off else end_time
-                roster.notes = notes
-                roster.role_title = user.position
-
+                is_off = request.form.get(f"off_{user.id}_{day}") == "1"
+                cell = {
+                    "is_off": is_off,
+                    "start_time": None if is_off else (request.form.get(f"start_{user.id}_{day}") or None),
+                    "end_time": None if is_off else (request.form.get(f"end_{user.id}_{day}") or None),
+                    "notes": request.form.get(f"notes_{user.id}_{day}") or None,
+                    "role_title": user.position,
+                }
+
+                current = existing.get((user.id, day))
+                if current is None:
+                    # Blank cells without a row stay blank; no need to store them.
+                    if is_off or cell["start_time"] or cell["end_time"] or cell["notes"]:
+                        inserts.append(dict(
+                            cell,
+                            user_id=user.id,
+                            day_of_week=day,
+                            week_start=week_start,
+                            week_end=week_end
+                        ))
+                elif any((getattr(current, key) or None) != (value or None) for key, value in cell.items()):
+                    updates.append(dict(cell, id=current.id))
+
+        if inserts:
+            db.session.execute(insert(Roster), inserts)
+        if updates:
+            db.session.execute(update(Roster), updates)
+        bump_cache_version("roster")
         db.session.commit()
         flash("✅ Weekly roster updated", "success")
         return redirect(url_for("roster_admin", week_start=week_start.isoformat()))
@@ -1087,7 +2289,7 @@ def handover():
         return redirect("/handover")
 
     messages = HandoverMessage.query.order_by(HandoverMessage.created_at.desc()).limit(200).all()
-    users = {u.id: u for u in User.query.all()}
+    users = get_user_directory()
     return render_template("handover.html", messages=messages, users=users, today=date.today())
 
 
@@ -1137,8 +2339,10 @@ def employee_management():
                     is_active=True
                 )
                 db.session.add(u)
-                db.session.commit()
+                user_changed()
                 log_activity(f"EMPLOYEE_ADDED", f"Added employee {name}")
+                db.session.commit()
+                invalidate_user()
                 flash(f"✅ Employee {name} added. Temp password: {temp_pwd}", "success")
         
         elif action == "toggle_active":
@@ -1146,9 +2350,11 @@ def employee_management():
             user = User.query.get(user_id)
             if user and (user.role != 'admin' and not user.is_admin):
                 user.is_active = not user.is_active
-                db.session.commit()
                 status = "activated" if user.is_active else "deactivated"
+                user_changed(user.id)
                 log_activity(f"EMPLOYEE_{status.upper()}", f"{user.name} {status}")
+                db.session.commit()
+                invalidate_user(user.id)
                 flash(f"✅ Employee {status}", "success")
         
         elif action == "update_employee":
@@ -1161,6 +2367,7 @@ def employee_management():
                     if admin_count <= 1:
                         flash("❌ Cannot remove the last admin.", "danger")
                         return redirect("/employee-management")
+                listed = [getattr(user, slot) for slot in UserRecord.__slots__]
                 user.email = request.form.get("email")
                 user.department = request.form.get("department")
                 user.employee_id = request.form.get("employee_id")
@@ -1171,8 +2378,12 @@ def employee_management():
                 user.role = role
                 user.is_admin = user.role == 'admin'
                 user.is_staff = request.form.get("is_staff") == "1"
-                db.session.commit()
+                # Reports only need rebuilding if the directory copy changed.
+                directory = listed != [getattr(user, slot) for slot in UserRecord.__slots__]
+                user_changed(user.id, directory=directory)
                 log_activity(f"EMPLOYEE_UPDATED", f"Updated {user.name}")
+                db.session.commit()
+                invalidate_user(user.id, directory=directory)
                 flash("✅ Employee updated", "success")
         
         return redirect("/employee-management")
@@ -1189,6 +2400,36 @@ def approve_timesheet():
         flash("❌ Access denied", "danger")
         return redirect("/dashboard")
     
+    if request.method == "POST" and request.form.get("bulk") == "1":
+        selected = request.form.get("scope") == "selected"
+        week = None if selected else request.form.get("week")
+        try:
+            week_start = datetime.strptime(week, "%Y-%m-%d").date() if week else None
+            entry_ids = [int(entry_id) for entry_id in request.form.getlist("entry_ids")] if selected else None
+        except ValueError:
+            flash("❌ Invalid week or entry selection", "danger")
+            return redirect("/approve-timesheet")
+        try:
+            approved, skipped, weeks_locked = bulk_approve_timesheets(
+                week_start=week_start,
+                department=None if selected else request.form.get("department") or None,
+                entry_ids=entry_ids,
+                lock_week=request.form.get("lock_week") == "1",
+                notes=request.form.get("notes", "")
+            )
+        except ValueError as e:
+            db.session.rollback()
+            flash(f"❌ {e}", "danger")
+            return redirect("/approve-timesheet")
+        db.session.commit()
+        message = f"✅ Approved {approved} timesheets"
+        if weeks_locked:
+            message += f", locked {weeks_locked} weeks"
+        if skipped:
+            message += f" ({skipped} skipped in locked weeks)"
+        flash(message, "success")
+        return redirect("/approve-timesheet")
+
     if request.method == "POST":
         entry_id = request.form.get("entry_id")
         action_type = request.form.get("action_type")  # approve or reject
@@ -1201,7 +2442,6 @@ def approve_timesheet():
             entry.approved_by = current_user.id
             entry.approved_at = datetime.now()
             entry.notes = notes
-            db.session.commit()
 
             if lock_week and action_type == 'approve':
                 w_start, w_end = get_week_range(entry.day)
@@ -1212,48 +2452,216 @@ def approve_timesheet():
                 lock.locked = True
                 lock.approved_by = current_user.id
                 lock.approved_at = datetime.now()
-                db.session.commit()
                 log_activity("WEEK_LOCKED", f"User {entry.user_id} week {w_start}–{w_end}")
             
-            user = User.query.get(entry.user_id)
+            user = get_user_directory().get(entry.user_id)
             action = "APPROVED" if action_type == 'approve' else "REJECTED"
-            log_activity(f"TIMESHEET_{action}", f"Timesheet for {user.name} on {entry.day}")
+            log_activity(f"TIMESHEET_{action}", f"Timesheet for {user.name if user else entry.user_id} on {entry.day}")
+            db.session.commit()
             flash(f"✅ Timesheet {action_type}ed", "success")
         
         return redirect("/approve-timesheet")
     
-    # Get pending timesheets
-    pending_entries = TimeEntry.query.filter(
+    # Pending timesheets in the date range, newest first, one page at a time
+    this_week = get_week_range()[0]
+    try:
+        start = datetime.strptime(request.args["from"], "%Y-%m-%d").date() if request.args.get("from") else this_week - timedelta(weeks=4)
+        end = datetime.strptime(request.args["to"], "%Y-%m-%d").date() if request.args.get("to") else this_week + timedelta(days=6)
+        before = None
+        if request.args.get("before"):
+            before_day, _, before_id = request.args["before"].partition("~")
+            before = (datetime.strptime(before_day, "%Y-%m-%d").date(), int(before_id))
+    except ValueError:
+        flash("❌ Invalid date range", "danger")
+        return redirect("/approve-timesheet")
+    department = request.args.get("department") or None
+
+    query = TimeEntry.query.filter(
+        TimeEntry.day >= start,
+        TimeEntry.day <= end,
         TimeEntry.status != 'approved',
         TimeEntry.clock_in.isnot(None),
         TimeEntry.clock_out.isnot(None)
-    ).all()
+    )
+    if department:
+        query = query.filter(TimeEntry.user_id.in_(
+            select(User.id).where(User.department == department)
+        ))
+    if before is not None:
+        query = query.filter(tuple_(TimeEntry.day, TimeEntry.id) < tuple_(*before))
+    page_size = app.config.get("APPROVAL_PAGE_SIZE", 100)
+    pending_entries = query.order_by(TimeEntry.day.desc(), TimeEntry.id.desc()).limit(page_size + 1).all()
+    has_more = len(pending_entries) > page_size
+    pending_entries = pending_entries[:page_size]
+
     settings = get_settings()
-    users_map = {u.id: u for u in User.query.all()}
-    
+    users_map = get_user_directory()
+    weeks = [get_week_range(entry.day)[0] for entry in pending_entries]
+    locked = locked_weeks(zip((entry.user_id for entry in pending_entries), weeks))
+
     entries_data = []
-    for entry in pending_entries:
+    work, _, overtime = entry_minutes(
+        (entry_times(entry) for entry in pending_entries),
+        overtime_after=int(settings.working_hours_per_day * 60)
+    )
+    for entry, w_start, work_mins, overtime_mins in zip(pending_entries, weeks, work, overtime):
         user = users_map.get(entry.user_id)
-        if entry.clock_in:
-            work_mins, break_mins = work_and_break_minutes(entry)
-            overtime_mins = daily_overtime_minutes(work_mins, settings)
-            w_start, w_end = get_week_range(entry.day)
-            entries_data.append({
-                'id': entry.id,
-                'user_name': user.name,
-                'date': entry.day,
-                'week_start': w_start,
-                'week_end': w_end,
-                'work_minutes': work_mins,
-                'clock_in': format_time(entry.clock_in),
-                'clock_out': format_time(entry.clock_out),
-                'overtime_minutes': overtime_mins,
-                'is_locked': is_week_locked(entry.user_id, entry.day),
-                'shift_notes': entry.shift_notes,
-                'audit_url': url_for('audit_log')
-            })
-    
-    return render_template("approve_timesheet.html", entries=entries_data)
+        entries_data.append({
+            'id': entry.id,
+            'user_name': user.name if user else entry.user_id,
+            'date': entry.day,
+            'week_start': w_start,
+            'week_end': w_start + timedelta(days=6),
+            'work_minutes': work_mins,
+            'clock_in': format_time(entry.clock_in),
+            'clock_out': format_time(entry.clock_out),
+            'overtime_minutes': overtime_mins,
+            'is_locked': (entry.user_id, w_start) in locked,
+            'shift_notes': entry.shift_notes,
+            'audit_url': url_for('audit_log', user=entry.user_id)
+        })
+
+    next_url = None
+    if has_more:
+        last = pending_entries[-1]
+        next_url = url_for(
+            'approve_timesheet', before=f"{last.day.isoformat()}~{last.id}",
+            **{k: v for k, v in request.args.items() if k in ("from", "to", "department") and v}
+        )
+
+    return render_template(
+        "approve_timesheet.html",
+        entries=entries_data,
+        departments=users_map.departments,
+        this_week=this_week,
+        range_start=start,
+        range_end=end,
+        department=department,
+        next_url=next_url
+    )
+
+
+def bulk_approve_timesheets(week_start=None, department=None, entry_ids=None, lock_week=False, notes=""):
+    """Approve every pending, completed entry matching the filters at once.
+
+    Filters combine: the Monday-Sunday week containing week_start, a
+    department and/or explicit entry ids. A week or entry ids are required,
+    so a department alone never approves its whole history. Entries in
+    locked weeks are skipped. All entries are updated with one UPDATE,
+    week locks are upserted in bulk and one audit record summarizes the
+    batch; the caller commits. Returns (approved, skipped_locked, weeks_locked).
+    """
+    if week_start is None and not entry_ids:
+        raise ValueError("Choose a week or entries to approve")
+
+    query = db.session.query(TimeEntry.id, TimeEntry.user_id, TimeEntry.day).filter(
+        TimeEntry.status != 'approved',
+        TimeEntry.clock_in.isnot(None),
+        TimeEntry.clock_out.isnot(None)
+    )
+    if week_start is not None:
+        w_start, w_end = get_week_range(week_start)
+        query = query.filter(TimeEntry.day >= w_start, TimeEntry.day <= w_end)
+    if department:
+        query = query.filter(TimeEntry.user_id.in_(
+            select(User.id).where(User.department == department)
+        ))
+    if entry_ids:
+        query = query.filter(TimeEntry.id.in_(entry_ids))
+
+    rows = [(entry_id, user_id, get_week_range(day)[0]) for entry_id, user_id, day in query]
+    locked = locked_weeks((user_id, w_start) for _, user_id, w_start in rows)
+    approve = [row for row in rows if (row[1], row[2]) not in locked]
+    if not approve:
+        return 0, len(rows), 0
+
+    now = datetime.now()
+    db.session.execute(
+        update(TimeEntry)
+        .where(TimeEntry.id.in_([entry_id for entry_id, _, _ in approve]))
+        .values(status='approved', approved_by=current_user.id, approved_at=now, notes=notes)
+        .execution_options(synchronize_session=False)
+    )
+
+    weeks = set()
+    if lock_week:
+        weeks = {(user_id, w_start) for _, user_id, w_start in approve}
+        existing = {
+            (row.user_id, row.week_start): row.id
+            for row in db.session.query(
+                WeekApproval.id, WeekApproval.user_id, WeekApproval.week_start
+            ).filter(
+                WeekApproval.user_id.in_({user_id for user_id, _ in weeks}),
+                WeekApproval.week_start.in_({w_start for _, w_start in weeks})
+            )
+        }
+        lock_values = {"locked": True, "status": 'approved', "approved_by": current_user.id, "approved_at": now}
+        updates = [dict(lock_values, id=existing[week]) for week in weeks if week in existing]
+        inserts = [
+            dict(lock_values, user_id=user_id, week_start=w_start, week_end=w_start + timedelta(days=6))
+            for user_id, w_start in weeks if (user_id, w_start) not in existing
+        ]
+        if updates:
+            db.session.execute(update(WeekApproval), updates)
+        if inserts:
+            db.session.execute(insert(WeekApproval), inserts)
+
+    scope = []
+    if week_start is not None:
+        scope.append(f"week {w_start}–{w_end}")
+    if department:
+        scope.append(f"department {department}")
+    if entry_ids:
+        scope.append(f"{len(entry_ids)} selected")
+    log_activity(
+        "TIMESHEETS_BULK_APPROVED",
+        f"{len(approve)} entries for {len({row[1] for row in approve})} staff ({', '.join(scope)})"
+        f"; {len(rows) - len(approve)} skipped in locked weeks; {len(weeks)} weeks locked"
+    )
+    return len(approve), len(rows) - len(approve), len(weeks)
+
+
+@app.route("/api/timesheets/approve", methods=["POST"])
+@login_required
+def api_bulk_approve():
+    """JSON: {"week": "YYYY-MM-DD", "department": ..., "entry_ids": [...], "lock_week": bool, "notes": ...}"""
+    if current_user.role != 'admin' and not current_user.is_admin:
+        return jsonify({"error": "Unauthorized"}), 403
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Send a JSON object"}), 400
+
+    week = data.get("week")
+    try:
+        week_start = datetime.strptime(week, "%Y-%m-%d").date() if week else None
+    except (TypeError, ValueError):
+        return jsonify({"error": "week must be a date (YYYY-MM-DD)"}), 400
+    entry_ids = data.get("entry_ids") or []
+    if not isinstance(entry_ids, list) or not all(
+        (isinstance(entry_id, int) and not isinstance(entry_id, bool))
+        or (isinstance(entry_id, str) and entry_id.isdigit())
+        for entry_id in entry_ids
+    ):
+        return jsonify({"error": "entry_ids must be a list of entry ids"}), 400
+    department = data.get("department") or None
+    notes = data.get("notes") or ""
+    if not isinstance(department, (str, type(None))) or not isinstance(notes, str):
+        return jsonify({"error": "department and notes must be strings"}), 400
+
+    try:
+        approved, skipped, weeks_locked = bulk_approve_timesheets(
+            week_start=week_start,
+            department=department,
+            entry_ids=[int(entry_id) for entry_id in entry_ids],
+            lock_week=bool(data.get("lock_week")),
+            notes=notes
+        )
+    except ValueError as e:
+        # Only bulk_approve_timesheets' own messages reach here.
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+    db.session.commit()
+    return jsonify({"approved": approved, "skipped_locked": skipped, "weeks_locked": weeks_locked})
 
 
 @app.route("/save-notes", methods=["POST"])
@@ -1264,8 +2672,8 @@ def save_notes():
         flash("❌ This week is locked. Notes cannot be edited.", "danger")
         return redirect("/dashboard")
     entry.shift_notes = request.form.get("shift_notes", "").strip()
-    db.session.commit()
     log_activity("SHIFT_NOTES_UPDATED", f"{current_user.name} notes for {entry.day}")
+    db.session.commit()
     flash("✅ Notes saved", "success")
     return redirect("/dashboard")
 
@@ -1289,8 +2697,8 @@ def request_correction():
             reason=request.form.get("reason")
         )
         db.session.add(req)
-        db.session.commit()
         log_activity("CORRECTION_REQUESTED", f"{current_user.name} {entry_date}")
+        db.session.commit()
         flash("✅ Correction request submitted", "success")
         return redirect("/request-correction")
 
@@ -1319,10 +2727,7 @@ def approve_corrections():
             req.reviewed_at = datetime.now()
 
             if decision == 'approve':
-                entry = TimeEntry.query.filter_by(user_id=req.user_id, day=req.entry_date).first()
-                if not entry:
-                    entry = TimeEntry(user_id=req.user_id, day=req.entry_date)
-                    db.session.add(entry)
+                entry = get_or_create_entry(req.user_id, req.entry_date)
                 base_day = datetime.combine(req.entry_date, datetime.min.time())
                 if req.requested_clock_in:
                     h, m = map(int, req.requested_clock_in.split(":"))
@@ -1343,15 +2748,16 @@ def approve_corrections():
                     for msg in errors:
                         flash(msg, "danger")
                     return redirect("/approve-corrections")
+                refresh_totals(req.user_id, [req.entry_date])
 
-            db.session.commit()
             log_activity("CORRECTION_REVIEWED", f"{req.user_id} {req.entry_date} {req.status}")
+            db.session.commit()
             flash("✅ Correction request updated", "success")
 
         return redirect("/approve-corrections")
 
     pending = CorrectionRequest.query.filter_by(status='pending').all()
-    users = {u.id: u for u in User.query.all()}
+    users = get_user_directory()
     return render_template("approve_corrections.html", requests=pending, users=users)
 
 
@@ -1370,8 +2776,8 @@ def leave_request():
             reason=request.form.get("reason")
         )
         db.session.add(req)
-        db.session.commit()
         log_activity("LEAVE_REQUESTED", f"{current_user.name} {start}–{end}")
+        db.session.commit()
         flash("✅ Leave request submitted", "success")
         return redirect("/leave-request")
 
@@ -1394,17 +2800,318 @@ def approve_leave():
             req.status = 'approved' if decision == 'approve' else 'rejected'
             req.reviewed_by = current_user.id
             req.reviewed_at = datetime.now()
-            db.session.commit()
             log_activity("LEAVE_REVIEWED", f"{req.user_id} {req.start_date}–{req.end_date} {req.status}")
+            db.session.commit()
             flash("✅ Leave request updated", "success")
 
         return redirect("/approve-leave")
 
     pending = LeaveRequest.query.filter_by(status='pending').all()
-    users = {u.id: u for u in User.query.all()}
+    users = get_user_directory()
     return render_template("approve_leave.html", requests=pending, users=users)
 
 
+# ---------------- ACTIVITY ARCHIVE ----------------
+ARCHIVE_FILE_RE = re.compile(r"activity_log-(\d{4}-\d{2})\.ndjson\.gz")
+
+
+class ArchivedLog:
+    """An ActivityLog row read back from a monthly archive file."""
+
+    __slots__ = ("id", "user_id", "action", "details", "timestamp")
+    archived = True
+
+    def __init__(self, id, user_id, action, details, timestamp):
+        self.id = id
+        self.user_id = user_id
+        self.action = action
+        self.details = details
+        self.timestamp = timestamp
+
+
+def archive_path(month):
+    return os.path.join(app.config["ACTIVITY_LOG_ARCHIVE_DIR"], f"activity_log-{month}.ndjson.gz")
+
+
+def archive_months():
+    """Months (YYYY-MM) that have an archive file, oldest first."""
+    try:
+        names = os.listdir(app.config["ACTIVITY_LOG_ARCHIVE_DIR"])
+    except FileNotFoundError:
+        return []
+    return sorted(m.group(1) for m in map(ARCHIVE_FILE_RE.fullmatch, names) if m)
+
+
+ARCHIVE_INDEX_SCHEMA = """
+CREATE TABLE log (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER,
+    action TEXT,
+    details TEXT,
+    timestamp TEXT NOT NULL
+);
+CREATE TABLE source (mtime REAL NOT NULL, size INTEGER NOT NULL);
+"""
+
+
+def archive_index_path(month):
+    return os.path.join(app.config["ACTIVITY_LOG_ARCHIVE_DIR"], f"activity_log-{month}.sqlite")
+
+
+def archive_timestamp(value):
+    # Fixed width so the index's text order is time order.
+    return value.isoformat(timespec="microseconds")
+
+
+def _build_archive_index(path, index_path, stamp):
+    """Load a month's gzip NDJSON into a SQLite file indexed on (timestamp, id).
+
+    Rows are streamed in batches, so memory stays flat however large the
+    month is. The file is built under a temporary name and moved into place,
+    so concurrent readers see either the old index or the finished new one.
+    """
+    fd, tmp = tempfile.mkstemp(prefix=os.path.basename(index_path) + ".", dir=os.path.dirname(index_path))
+    os.close(fd)
+    conn = sqlite3.connect(tmp)
+    try:
+        conn.executescript(ARCHIVE_INDEX_SCHEMA)
+        batch = []
+        insert_rows = "INSERT OR IGNORE INTO log VALUES (?, ?, ?, ?, ?)"
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        rec = json.loads(line)
+                        batch.append((rec["id"], rec["user_id"], rec["action"], rec["details"],
+                                      archive_timestamp(datetime.fromisoformat(rec["timestamp"]))))
+                        if len(batch) >= 5000:
+                            conn.executemany(insert_rows, batch)
+                            batch.clear()
+        except (EOFError, gzip.BadGzipFile) as e:
+            # A run interrupted mid-write leaves a truncated last member.
+            print(f"Archive warning: {path}: {e}")
+        # The id key means rows re-archived after a failed delete appear once.
+        conn.executemany(insert_rows, batch)
+        conn.execute("CREATE INDEX ix_log_timestamp_id ON log (timestamp, id)")
+        conn.execute("INSERT INTO source VALUES (?, ?)", stamp)
+        conn.commit()
+    except BaseException:
+        conn.close()
+        os.unlink(tmp)
+        raise
+    conn.close()
+    os.replace(tmp, index_path)
+
+
+def open_archive_month(month):
+    """A read-only connection to a month's archive index, or None.
+
+    The index is rebuilt whenever the gzip file's mtime or size no longer
+    match the ones it was built from.
+    """
+    path = archive_path(month)
+    try:
+        info = os.stat(path)
+    except FileNotFoundError:
+        return None
+    stamp = (info.st_mtime, info.st_size)
+    index_path = archive_index_path(month)
+    uri = f"file:{index_path}?mode=ro"
+    conn = None
+    try:
+        conn = sqlite3.connect(uri, uri=True)
+        if conn.execute("SELECT mtime, size FROM source").fetchone() == stamp:
+            return conn
+    except sqlite3.DatabaseError:
+        pass
+    if conn is not None:
+        conn.close()
+    _build_archive_index(path, index_path, stamp)
+    return sqlite3.connect(uri, uri=True)
+
+
+def _append_archive(month, rows):
+    path = archive_path(month)
+    with open(path, "ab") as raw:
+        # Each call appends one gzip member; readers see the concatenation.
+        with gzip.GzipFile(fileobj=raw, mode="wb") as f:
+            for row in rows:
+                f.write((json.dumps({
+                    "id": row.id,
+                    "user_id": row.user_id,
+                    "action": row.action,
+                    "details": row.details,
+                    "timestamp": row.timestamp.isoformat(),
+                }) + "\n").encode("utf-8"))
+        raw.flush()
+        os.fsync(raw.fileno())
+
+
+def archive_activity_log(days=None, batch_size=None):
+    """Move ActivityLog rows older than the retention period to archive files.
+
+    Rows go oldest first in batches: each batch is appended to its month's
+    gzip NDJSON file and synced before being deleted in its own short
+    transaction, so the write lock is only held for one DELETE at a time.
+    Returns the number of rows archived.
+    """
+    days = app.config.get("ACTIVITY_LOG_RETENTION_DAYS", 180) if days is None else days
+    batch_size = batch_size or app.config.get("ACTIVITY_LOG_ARCHIVE_BATCH", 2000)
+    cutoff = datetime.now() - timedelta(days=days)
+    os.makedirs(app.config["ACTIVITY_LOG_ARCHIVE_DIR"], exist_ok=True)
+
+    total = 0
+    while True:
+        rows = db.session.execute(
+            select(ActivityLog.id, ActivityLog.user_id, ActivityLog.action,
+                   ActivityLog.details, ActivityLog.timestamp)
+            .where(ActivityLog.timestamp < cutoff)
+            .order_by(ActivityLog.timestamp, ActivityLog.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            db.session.rollback()
+            return total
+        by_month = {}
+        for row in rows:
+            by_month.setdefault(row.timestamp.strftime("%Y-%m"), []).append(row)
+        for month, month_rows in by_month.items():
+            _append_archive(month, month_rows)
+        ActivityLog.query.filter(
+            ActivityLog.id.in_([row.id for row in rows])
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        total += len(rows)
+
+
+def iter_archived_logs(filters, before=None, after=None):
+    """Archived rows matching the audit filters, in page order.
+
+    Newest first, or oldest first with after. Only the months the filters
+    and cursor can reach are opened, one at a time as the caller consumes,
+    and each is read through its (timestamp, id) index a row at a time.
+    """
+    months = archive_months()
+    if filters["start"]:
+        months = [m for m in months if m >= filters["start"].strftime("%Y-%m")]
+    if filters["end"]:
+        months = [m for m in months if m <= filters["end"].strftime("%Y-%m")]
+    if before is not None:
+        months = [m for m in months if m <= before[0].strftime("%Y-%m")]
+    if after is not None:
+        months = [m for m in months if m >= after[0].strftime("%Y-%m")]
+    else:
+        months.reverse()
+
+    where, params = [], []
+    if filters["user_id"] is not None:
+        where.append("user_id = ?")
+        params.append(filters["user_id"])
+    if filters["action"]:
+        where.append("action = ?")
+        params.append(filters["action"])
+    if filters["start"]:
+        where.append("timestamp >= ?")
+        params.append(archive_timestamp(filters["start"]))
+    if filters["end"]:
+        where.append("timestamp < ?")
+        params.append(archive_timestamp(filters["end"]))
+    if before is not None:
+        where.append("(timestamp, id) < (?, ?)")
+        params += [archive_timestamp(before[0]), before[1]]
+    if after is not None:
+        where.append("(timestamp, id) > (?, ?)")
+        params += [archive_timestamp(after[0]), after[1]]
+    sql = "SELECT id, user_id, action, details, timestamp FROM log"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY timestamp, id" if after is not None else " ORDER BY timestamp DESC, id DESC"
+
+    for month in months:
+        conn = open_archive_month(month)
+        if conn is None:
+            continue
+        try:
+            for log_id, user_id, action, details, timestamp in conn.execute(sql, params):
+                yield ArchivedLog(log_id, user_id, action, details, datetime.fromisoformat(timestamp))
+        finally:
+            conn.close()
+
+
+@app.cli.command("archive-activity")
+@click.option("--days", type=int, default=None, help="Keep this many days in the database.")
+def archive_activity_command(days):
+    """Move old activity log rows to monthly gzip NDJSON archives."""
+    activity_buffer.flush()
+    archived = archive_activity_log(days)
+    print(f"✅ Archived {archived} activity log rows to {app.config['ACTIVITY_LOG_ARCHIVE_DIR']}")
+
+
+AUDIT_EXPORT_FIELDS = ["timestamp", "id", "user_id", "user_name", "action", "details"]
+
+
+def audit_filters(args):
+    """Parse ?user=&action=&from=&to= into filters; raises ValueError."""
+    start = args.get("from")
+    end = args.get("to")
+    return {
+        "user_id": int(args["user"]) if args.get("user") else None,
+        "action": (args.get("action") or "").strip().upper() or None,
+        "start": datetime.strptime(start, "%Y-%m-%d") if start else None,
+        "end": datetime.strptime(end, "%Y-%m-%d") + timedelta(days=1) if end else None,
+    }
+
+
+def encode_audit_cursor(log):
+    return f"{log.timestamp.isoformat()}~{log.id}"
+
+
+def decode_audit_cursor(value):
+    timestamp, _, log_id = value.rpartition("~")
+    return datetime.fromisoformat(timestamp), int(log_id)
+
+
+def activity_log_query(filters, before=None, after=None):
+    """ActivityLog select for the filters, newest first.
+
+    before/after are (timestamp, id) keys; with after the order is reversed
+    so the rows just newer than the key come first.
+    """
+    key = tuple_(ActivityLog.timestamp, ActivityLog.id)
+    stmt = select(ActivityLog)
+    if filters["user_id"] is not None:
+        stmt = stmt.where(ActivityLog.user_id == filters["user_id"])
+    if filters["action"]:
+        stmt = stmt.where(ActivityLog.action == filters["action"])
+    if filters["start"]:
+        stmt = stmt.where(ActivityLog.timestamp >= filters["start"])
+    if filters["end"]:
+        stmt = stmt.where(ActivityLog.timestamp < filters["end"])
+    if before is not None:
+        stmt = stmt.where(key < tuple_(*before))
+    if after is not None:
+        return stmt.where(key > tuple_(*after)).order_by(ActivityLog.timestamp, ActivityLog.id)
+    return stmt.order_by(ActivityLog.timestamp.desc(), ActivityLog.id.desc())
+
+
+def audit_page(filters, limit, before=None, after=None):
+    """Up to limit audit rows across the hot table and the archives.
+
+    Archives are read only when the table alone cannot fill the page, or
+    when paging forward from a cursor inside the archived range.
+    """
+    logs = db.session.execute(
+        activity_log_query(filters, before=before, after=after).limit(limit)
+    ).scalars().all()
+    if after is not None:
+        logs = list(islice(iter_archived_logs(filters, after=after), limit)) + logs
+        logs.sort(key=lambda log: (log.timestamp, log.id))
+    elif len(logs) < limit:
+        logs += islice(iter_archived_logs(filters, before=before), limit - len(logs))
+        logs.sort(key=lambda log: (log.timestamp, log.id), reverse=True)
+    return logs[:limit]
+
+
 @app.route("/audit-log")
 @login_required
 def audit_log():
@@ -1412,57 +3119,198 @@ def audit_log():
         flash("❌ Access denied", "danger")
         return redirect("/dashboard")
 
-    logs = ActivityLog.query.order_by(ActivityLog.timestamp.desc()).limit(300).all()
-    users = {u.id: u for u in User.query.all()}
-    return render_template("audit_log.html", logs=logs, users=users)
+    activity_buffer.flush()
+    try:
+        filters = audit_filters(request.args)
+        before = decode_audit_cursor(request.args["before"]) if request.args.get("before") else None
+        after = decode_audit_cursor(request.args["after"]) if request.args.get("after") else None
+    except ValueError:
+        flash("❌ Invalid audit log filter", "danger")
+        return redirect("/audit-log")
+
+    page_size = app.config.get("AUDIT_PAGE_SIZE", 100)
+    logs = audit_page(filters, page_size + 1, before=before, after=after)
+    has_more = len(logs) > page_size
+    logs = logs[:page_size]
+    if after is not None:
+        logs.reverse()
+        older = bool(logs)
+        newer = has_more
+    else:
+        older = has_more
+        newer = before is not None
 
+    params = {k: v for k, v in request.args.items() if k in ("user", "action", "from", "to") and v}
+    older_url = url_for("audit_log", before=encode_audit_cursor(logs[-1]), **params) if older and logs else None
+    newer_url = url_for("audit_log", after=encode_audit_cursor(logs[0]), **params) if newer and logs else None
+    users = get_user_directory()
+    return render_template(
+        "audit_log.html",
+        logs=logs,
+        users=users,
+        user_choices=users.choices,
+        filters=request.args,
+        older_url=older_url,
+        newer_url=newer_url,
+        export_params=params
+    )
 
-@app.route("/export-payroll")
+
+@app.route("/audit-log/export")
 @login_required
-def export_payroll():
+def export_audit_log():
     if current_user.role != 'admin' and not current_user.is_admin:
         flash("❌ Access denied", "danger")
         return redirect("/dashboard")
 
-    export_format = request.args.get('format', 'csv')
-    week_date = request.args.get('week', date.today().isoformat())
-    week_date_obj = datetime.strptime(week_date, '%Y-%m-%d').date()
-    w_start, w_end = get_week_range(week_date_obj)
-    settings = get_settings()
+    activity_buffer.flush()
+    export_format = request.args.get("format", "csv")
+    try:
+        filters = audit_filters(request.args)
+    except ValueError:
+        flash("❌ Invalid audit log filter", "danger")
+        return redirect("/audit-log")
 
-    employees = User.query.filter_by(role='employee', is_active=True).all()
-    rows = []
+    log_activity("EXPORT_AUDIT_LOG", f"Audit log {export_format}")
+    db.session.commit()
+    users = get_user_directory()
+    stmt = activity_log_query(filters).execution_options(yield_per=1000)
+
+    def logs():
+        yield from db.session.execute(stmt).scalars()
+        # Archived months are all older than the table, newest first.
+        yield from iter_archived_logs(filters)
+
+    def records():
+        for log in logs():
+            user = users.get(log.user_id)
+            yield [
+                log.timestamp.isoformat(), log.id, log.user_id,
+                user.name if user else "", log.action, log.details or ""
+            ]
+
+    if export_format == "ndjson":
+        def generate():
+            for record in records():
+                yield json.dumps(dict(zip(AUDIT_EXPORT_FIELDS, record))) + "\n"
+        mimetype, extension = "application/x-ndjson", "ndjson"
+    else:
+        def generate():
+            writer = csv.writer(_EchoWriter())
+            yield writer.writerow(AUDIT_EXPORT_FIELDS)
+            for record in records():
+                yield writer.writerow(record)
+        mimetype, extension = "text/csv", "csv"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename=audit_log_{date.today()}.{extension}"}
+    )
 
-    weekly_threshold_mins = int(settings.overtime_threshold_hours * 60)
-    for emp in employees:
-        entries = TimeEntry.query.filter(
-            TimeEntry.user_id == emp.id,
-            TimeEntry.day >= w_start,
-            TimeEntry.day <= w_end
-        ).all()
 
-        total_work = 0
-        total_break = 0
-        for entry in entries:
-            if entry.clock_in:
-                work, brk = work_and_break_minutes(entry)
-                total_work += work
-                total_break += brk
+@app.route("/admin/mail-stats")
+@login_required
+def mail_stats():
+    if current_user.role != 'admin' and not current_user.is_admin:
+        return jsonify({"error": "Unauthorized"}), 403
+    return jsonify(mail_queue.stats())
+
 
-        regular_mins = min(total_work, weekly_threshold_mins)
-        overtime_mins = max(0, total_work - weekly_threshold_mins)
+PAYROLL_HEADER = ["Employee ID", "Name", "Department", "Week Start", "Week End", "Regular Hours", "Overtime Hours", "Total Hours", "Break Hours"]
+
+
+class _EchoWriter:
+    """File-like object whose write() hands the CSV line back to the caller."""
+
+    def write(self, value):
+        return value
 
-        rows.append({
-            "emp_id": emp.employee_id or "",
-            "name": emp.name,
-            "dept": emp.department or "",
-            "week_start": w_start.isoformat(),
-            "week_end": w_end.isoformat(),
-            "regular_hours": round(regular_mins / 60, 2),
-            "overtime_hours": round(overtime_mins / 60, 2),
-            "total_hours": round(total_work / 60, 2),
-            "break_hours": round(total_break / 60, 2),
-        })
+
+# A year of dates can touch 54 Monday-Sunday weeks.
+PAYROLL_MAX_WEEKS = 54
+
+
+def payroll_range(args):
+    """Resolve ?week=, ?month=YYYY-MM or ?from=&to= to whole Monday-Sunday weeks."""
+    if args.get('month'):
+        first_day = datetime.strptime(args['month'], '%Y-%m').date()
+        next_month = (first_day.replace(day=28) + timedelta(days=4)).replace(day=1)
+        start, end = first_day, next_month - timedelta(days=1)
+    elif args.get('from') or args.get('to'):
+        start = datetime.strptime(args.get('from') or args.get('to'), '%Y-%m-%d').date()
+        end = datetime.strptime(args.get('to') or args.get('from'), '%Y-%m-%d').date()
+    else:
+        start = end = datetime.strptime(args.get('week', date.today().isoformat()), '%Y-%m-%d').date()
+    if end < start:
+        start, end = end, start
+    return get_week_range(start)[0], get_week_range(end)[1]
+
+
+def iter_payroll_rows(start, end):
+    """Yield one payroll row per active employee per week in [start, end].
+
+    Reads a single cursor of employees outer-joined to their weekly totals,
+    ordered by employee and week, so no time entries are touched and only
+    one employee's weeks are held in memory at a time.
+    """
+    week_starts = [start + timedelta(weeks=i) for i in range((end - start).days // 7 + 1)]
+
+    stmt = select(
+        User.id, User.employee_id, User.name, User.department, WeeklyTotals.week_start,
+        WeeklyTotals.work_minutes, WeeklyTotals.break_minutes, WeeklyTotals.overtime_minutes
+    ).outerjoin(WeeklyTotals, and_(
+        WeeklyTotals.user_id == User.id,
+        WeeklyTotals.week_start >= start,
+        WeeklyTotals.week_start <= end
+    )).where(
+        User.role == 'employee',
+        User.is_active == True
+    ).order_by(User.id, WeeklyTotals.week_start).execution_options(yield_per=1000)
+
+    def employee_rows(emp, weeks):
+        for w_start in week_starts:
+            total_work, total_break, overtime_mins = weeks.get(w_start, (0, 0, 0))
+            yield [
+                emp.employee_id or "",
+                emp.name,
+                emp.department or "",
+                w_start.isoformat(),
+                (w_start + timedelta(days=6)).isoformat(),
+                round((total_work - overtime_mins) / 60, 2),
+                round(overtime_mins / 60, 2),
+                round(total_work / 60, 2),
+                round(total_break / 60, 2),
+            ]
+
+    emp = None
+    weeks = {}
+    for row in db.session.execute(stmt):
+        if emp is None or row.id != emp.id:
+            if emp is not None:
+                yield from employee_rows(emp, weeks)
+            emp, weeks = row, {}
+        if row.week_start is not None:
+            weeks[row.week_start] = (row.work_minutes, row.break_minutes, row.overtime_minutes)
+    if emp is not None:
+        yield from employee_rows(emp, weeks)
+
+
+@app.route("/export-payroll")
+@login_required
+def export_payroll():
+    if current_user.role != 'admin' and not current_user.is_admin:
+        flash("❌ Access denied", "danger")
+        return redirect("/dashboard")
+
+    export_format = request.args.get('format', 'csv')
+    try:
+        w_start, w_end = payroll_range(request.args)
+    except ValueError:
+        flash("❌ Invalid payroll date range", "danger")
+        return redirect("/reports")
+    if (w_end - w_start).days // 7 + 1 > PAYROLL_MAX_WEEKS:
+        return "Payroll exports cover at most a year; narrow the from/to range.", 400
 
     if export_format == "xlsx":
         try:
@@ -1471,40 +3319,38 @@ def export_payroll():
             flash("❌ Install openpyxl to export Excel", "danger")
             return redirect("/reports")
 
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Payroll"
-        ws.append(["Employee ID", "Name", "Department", "Week Start", "Week End", "Regular Hours", "Overtime Hours", "Total Hours", "Break Hours"])
-        for r in rows:
-            ws.append([r["emp_id"], r["name"], r["dept"], r["week_start"], r["week_end"], r["regular_hours"], r["overtime_hours"], r["total_hours"], r["break_hours"]])
+        # write_only spools rows to disk as they are appended.
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("Payroll")
+        ws.append(PAYROLL_HEADER)
+        for row in iter_payroll_rows(w_start, w_end):
+            ws.append(row)
 
-        mem = io.BytesIO()
-        wb.save(mem)
-        mem.seek(0)
+        tmp = tempfile.TemporaryFile()
+        wb.save(tmp)
+        tmp.seek(0)
         log_activity("EXPORT_XLSX", f"Payroll {w_start}–{w_end}")
+        db.session.commit()
         return send_file(
-            mem,
+            tmp,
             as_attachment=True,
             download_name=f'payroll_{w_start}_{w_end}.xlsx',
             mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
         )
 
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(["Employee ID", "Name", "Department", "Week Start", "Week End", "Regular Hours", "Overtime Hours", "Total Hours", "Break Hours"])
-    for r in rows:
-        writer.writerow([r["emp_id"], r["name"], r["dept"], r["week_start"], r["week_end"], r["regular_hours"], r["overtime_hours"], r["total_hours"], r["break_hours"]])
-
-    output.seek(0)
-    mem = io.BytesIO()
-    mem.write(output.getvalue().encode('utf-8'))
-    mem.seek(0)
     log_activity("EXPORT_CSV", f"Payroll {w_start}–{w_end}")
-    return send_file(
-        mem,
+    db.session.commit()
+
+    def generate():
+        writer = csv.writer(_EchoWriter())
+        yield writer.writerow(PAYROLL_HEADER)
+        for row in iter_payroll_rows(w_start, w_end):
+            yield writer.writerow(row)
+
+    return Response(
+        stream_with_context(generate()),
         mimetype='text/csv',
-        as_attachment=True,
-        download_name=f'payroll_{w_start}_{w_end}.csv'
+        headers={"Content-Disposition": f"attachment; filename=payroll_{w_start}_{w_end}.csv"}
     )
 
 
@@ -1526,6 +3372,7 @@ def forgot_password():
             token = secrets.token_urlsafe(32)
             reset = PasswordReset(user_id=user.id, token=token)
             db.session.add(reset)
+            log_activity("FORGOT_PASSWORD_REQUEST", f"Password reset requested for {user.email}")
             db.session.commit()
             
             # Send reset link via email or phone
@@ -1556,7 +3403,6 @@ TimeTracker Team"""
                     flash(f"🔗 Reset link: {reset_link}", "info")
             else:
                 flash("❌ No email or phone available for this user.", "danger")
-            log_activity("FORGOT_PASSWORD_REQUEST", f"Password reset requested for {user.email}")
         else:
             flash("❌ User not found", "danger")
     
@@ -1589,13 +3435,15 @@ def reset_password(token):
             user = User.query.get(reset.user_id)
             user.password = generate_password_hash(password)
             reset.is_used = True
+            user_changed(user.id, directory=False)
+            log_activity("PASSWORD_RESET", f"Password reset completed")
             db.session.commit()
+            invalidate_user(user.id, directory=False)
             
             send_email(user.email or "demo@example.com", "Password Reset Success", 
                       f"Hi {user.name}, your password has been reset successfully.")
             
             flash("✅ Password reset successful! Login with new password.", "success")
-            log_activity("PASSWORD_RESET", f"Password reset completed")
             return redirect("/login")
     
     return render_template("reset_password.html", token=token)
@@ -1635,6 +3483,7 @@ def export_csv():
         mem.seek(0)
         
         log_activity("EXPORT_CSV", f"Exported {len(employees)} employees")
+        db.session.commit()
         return send_file(
             mem,
             mimetype='text/csv',
@@ -1655,11 +3504,10 @@ def export_csv():
         writer = csv.writer(output)
         writer.writerow(['Date', 'Employee', 'Clock In', 'Clock Out', 'Work Hours', 'Break Minutes', 'Status'])
         
-        for entry in entries:
+        work, breaks, _ = entry_minutes(entry_times(entry) for entry in entries)
+        for entry, work_minutes, break_minutes in zip(entries, work, breaks):
             emp = users_map.get(entry.user_id)
-            work_minutes = minutes(entry.clock_in, entry.clock_out)
-            break_minutes = minutes(entry.lunch_start, entry.lunch_end) + minutes(entry.dinner_start, entry.dinner_end)
-            work_hours = (work_minutes - break_minutes) / 60 if work_minutes > 0 else 0
+            work_hours = work_minutes / 60
             
             writer.writerow([
                 entry.day.isoformat(),
@@ -1677,6 +3525,7 @@ def export_csv():
         mem.seek(0)
         
         log_activity("EXPORT_CSV", f"Exported timesheets for {selected_date}")
+        db.session.commit()
         return send_file(
             mem,
             mimetype='text/csv',
@@ -1685,6 +3534,30 @@ def export_csv():
         )
 
 
+def build_report(start, end, department=None):
+    """One row per active employee with their worked and break hours."""
+    employees = [
+        user for user in get_user_directory().values()
+        if user.role == 'employee' and user.is_active
+        and (department is None or user.department == department)
+    ]
+    totals = summarize_hours([emp.id for emp in employees], start, end)
+
+    report_data = []
+    for employee in employees:
+        total_work = totals[employee.id]["work"]
+        total_break = totals[employee.id]["break"]
+
+        report_data.append({
+            'name': employee.name,
+            'dept': employee.department,
+            'work_hours': f"{total_work/60:.1f}",
+            'break_hours': f"{total_break/60:.1f}",
+            'emp_id': employee.employee_id
+        })
+    return report_data
+
+
 @app.route("/reports")
 @login_required
 def reports():
@@ -1695,93 +3568,109 @@ def reports():
     
     report_type = request.args.get('type', 'daily')
     selected_date = request.args.get('date', date.today().isoformat())
+    department = request.args.get('dept') or None
     
     selected_date_obj = datetime.strptime(selected_date, '%Y-%m-%d').date()
-    employees = User.query.filter_by(role='employee', is_active=True).all()
     
-    report_data = []
-    for employee in employees:
-        if report_type == 'daily':
-            entries = TimeEntry.query.filter_by(user_id=employee.id, day=selected_date_obj).all()
-        else:  # weekly
-            w_start, w_end = get_week_range(selected_date_obj)
-            entries = TimeEntry.query.filter(
-                TimeEntry.user_id == employee.id,
-                TimeEntry.day >= w_start,
-                TimeEntry.day <= w_end
-            ).all()
-        
-        total_work = 0
-        total_break = 0
-        for entry in entries:
-            if entry.clock_in:
-                breaks = minutes(entry.lunch_start, entry.lunch_end) + minutes(entry.dinner_start, entry.dinner_end)
-                work = minutes(entry.clock_in, entry.clock_out) - breaks
-                if work > 0:
-                    total_work += work
-                total_break += breaks
-        
-        report_data.append({
-            'name': employee.name,
-            'dept': employee.department,
-            'work_hours': f"{total_work/60:.1f}",
-            'break_hours': f"{total_break/60:.1f}",
-            'emp_id': employee.employee_id
-        })
+    if report_type == 'daily':
+        start, end = selected_date_obj, selected_date_obj
+    else:  # weekly
+        report_type = 'weekly'
+        start, end = get_week_range(selected_date_obj)
+    report_data = report_cache.get(
+        (report_type, start, end, department), start, end,
+        lambda: build_report(start, end, department)
+    )
+    departments = get_user_directory().departments
     
     return render_template("reports.html", 
         report_type=report_type,
         selected_date=selected_date,
+        department=department,
+        departments=departments,
         report_data=report_data
     )
 
 
-@app.route("/action/<name>", methods=["POST"])
+@app.route("/admin/stats")
 @login_required
-def action(name):
-    if is_week_locked(current_user.id, date.today()):
-        flash("❌ This week is locked. Contact admin for changes.", "danger")
+def admin_stats():
+    """Admin: cache and mail queue counters for this worker."""
+    if current_user.role != 'admin' and not current_user.is_admin:
+        flash("❌ Access denied", "danger")
         return redirect("/dashboard")
-    entry = get_today_entry()
-    now = datetime.now()
+    return render_template(
+        "admin_stats.html",
+        report_stats=report_cache.stats(),
+        mail_stats=mail_queue.stats(),
+        pid=os.getpid()
+    )
 
-    if name == "clock_in":
-        if entry.clock_in:
-            flash("❌ You are already clocked in", "danger")
-            return redirect("/dashboard")
-        entry.clock_in = now
-        log_activity("CLOCK_IN", f"Clocked in at {now.strftime('%H:%M')}")
 
-    elif name == "lunch_start":
-        entry.lunch_start = now
-        log_activity("LUNCH_START", f"Lunch started at {now.strftime('%H:%M')}")
+def get_or_create_entry(user_id, day):
+    """The user's TimeEntry for a day, created atomically if missing.
 
-    elif name == "lunch_end":
-        if not entry.lunch_start or now <= entry.lunch_start:
-            flash("❌ Lunch end cannot be earlier than lunch start", "danger")
-            return redirect("/dashboard")
-        entry.lunch_end = now
-        log_activity("LUNCH_END", f"Lunch ended at {now.strftime('%H:%M')}")
+    INSERT ... ON CONFLICT DO NOTHING on the unique (user_id, day) key, then
+    a SELECT, so concurrent callers all end up with the same row. The row
+    is locked until the caller commits (FOR UPDATE on PostgreSQL; SQLite
+    already holds the write lock after the insert), so two taps cannot both
+    see an empty clock_in.
+    """
+    db.session.execute(
+        dialect_insert(TimeEntry)
+        .values(user_id=user_id, day=day, status='pending')
+        .on_conflict_do_nothing(index_elements=["user_id", "day"])
+    )
+    return TimeEntry.query.filter_by(user_id=user_id, day=day).with_for_update().populate_existing().one()
+
+
+# event -> (activity action, activity detail prefix)
+CLOCK_EVENT_LOG = {
+    "clock_in": ("CLOCK_IN", "Clocked in at"),
+    "lunch_start": ("LUNCH_START", "Lunch started at"),
+    "lunch_end": ("LUNCH_END", "Lunch ended at"),
+    "dinner_start": ("DINNER_START", "Dinner started at"),
+    "dinner_end": ("DINNER_END", "Dinner ended at"),
+    "clock_out": ("CLOCK_OUT", "Clocked out at"),
+}
+
+
+def _clock_event_error(entry, name, at):
+    if name == "clock_in" and entry.clock_in:
+        return "You are already clocked in"
+    if name == "lunch_end" and (not entry.lunch_start or at <= entry.lunch_start):
+        return "Lunch end cannot be earlier than lunch start"
+    if name == "dinner_end" and (not entry.dinner_start or at <= entry.dinner_start):
+        return "Dinner end cannot be earlier than dinner start"
+    if name == "clock_out":
+        if not entry.clock_in:
+            return "Clock in before clocking out"
+        if at <= entry.clock_in:
+            return "Clock out cannot be earlier than clock in"
+    return None
 
-    elif name == "dinner_start":
-        entry.dinner_start = now
-        log_activity("DINNER_START", f"Dinner started at {now.strftime('%H:%M')}")
 
-    elif name == "dinner_end":
-        if not entry.dinner_start or now <= entry.dinner_start:
-            flash("❌ Dinner end cannot be earlier than dinner start", "danger")
-            return redirect("/dashboard")
-        entry.dinner_end = now
-        log_activity("DINNER_END", f"Dinner ended at {now.strftime('%H:%M')}")
+def apply_clock_event(entry, name, at):
+    """Record one clock event at time at on the entry.
 
-    elif name == "clock_out":
-        if not entry.clock_in:
-            flash("❌ Clock in before clocking out", "danger")
-            return redirect("/dashboard")
-        if now <= entry.clock_in:
-            flash("❌ Clock out cannot be earlier than clock in", "danger")
-            return redirect("/dashboard")
-        entry.clock_out = now
+    Logs the activity and queues the clock-out summary email. Returns an
+    error message (and changes nothing) if the event is out of order or
+    would leave the entry failing validate_entry_time_order().
+    """
+    if name not in CLOCK_EVENT_LOG:
+        return "Unknown clock event"
+    error = _clock_event_error(entry, name, at)
+    if error:
+        return error
+
+    previous = getattr(entry, name)
+    setattr(entry, name, at)
+    errors = validate_entry_time_order(entry)
+    if errors:
+        setattr(entry, name, previous)
+        return errors[0].removeprefix("❌ ")
+
+    if name == "clock_out":
         entry.status = 'pending'
         entry.approved_by = None
         entry.approved_at = None
@@ -1799,12 +3688,461 @@ def action(name):
                 send_email_async(current_user.email, subject, body)
             else:
                 send_email(current_user.email, subject, body)
-        log_activity("CLOCK_OUT", f"Clocked out at {now.strftime('%H:%M')}")
 
+    activity, detail = CLOCK_EVENT_LOG[name]
+    log_activity(activity, f"{detail} {at.strftime('%H:%M')}", buffered=True)
+    if entry.day == date.today():
+        # Replayed punches for earlier days don't change the shift board.
+        db.session.info["clock_event"] = True
+    return None
+
+
+@app.route("/action/<name>", methods=["POST"])
+@login_required
+def action(name):
+    # A dashboard left open on a shared device may belong to someone else.
+    owner = request.form.get("user_id")
+    if owner and owner != str(current_user.id):
+        flash("❌ That page was for another user. Please try again.", "danger")
+        return redirect("/dashboard")
+    if is_week_locked(current_user.id, date.today()):
+        flash("❌ This week is locked. Contact admin for changes.", "danger")
+        return redirect("/dashboard")
+    entry = get_today_entry()
+
+    error = apply_clock_event(entry, name, datetime.now())
+    if error:
+        db.session.rollback()
+        flash(f"❌ {error}", "danger")
+        return redirect("/dashboard")
+
+    refresh_totals(entry.user_id, [entry.day])
     db.session.commit()
     flash(f"✅ {name.replace('_', ' ').title()} recorded", "success")
     return redirect("/dashboard")
 
 
+# ---------------- CLOCK API ----------------
+def entry_json(entry):
+    data = {"day": entry.day.isoformat(), "status": entry.status}
+    for field in TIME_FIELDS:
+        value = getattr(entry, field)
+        data[field] = value.isoformat() if value else None
+    return data
+
+
+def clock_totals_json(user_id, day):
+    """Today's and this week's minutes from the rollup tables."""
+    today = db.session.get(DailyTotals, (user_id, day))
+    week = db.session.get(WeeklyTotals, (user_id, get_week_range(day)[0]))
+    return {
+        "work_minutes": today.work_minutes if today else 0,
+        "break_minutes": today.break_minutes if today else 0,
+        "week_work_minutes": week.work_minutes if week else 0,
+        "week_overtime_minutes": week.overtime_minutes if week else 0,
+    }
+
+
+def stored_idempotent_response(key):
+    row = db.session.get(IdempotencyKey, (current_user.id, key))
+    if row is None:
+        return None
+    return Response(row.response, status=row.status_code, mimetype="application/json")
+
+
+def idempotent_json(key, payload, status_code, discard=False):
+    """Commit the caller's transaction together with the response for key.
+
+    With discard (error responses) the caller's work is rolled back first,
+    so only the stored response is committed. If a concurrent retry with
+    the same key committed first, its work wins and its stored response is
+    returned instead.
+    """
+    body = json.dumps(payload)
+    if discard:
+        db.session.rollback()
+        if not key:
+            return Response(body, status=status_code, mimetype="application/json")
+    if key:
+        db.session.add(IdempotencyKey(
+            user_id=current_user.id, key=key, status_code=status_code, response=body
+        ))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        stored = stored_idempotent_response(key) if key else None
+        if stored is None:
+            raise
+        return stored
+    return Response(body, status=status_code, mimetype="application/json")
+
+
+def prune_idempotency_keys():
+    cutoff = datetime.now() - timedelta(hours=app.config.get("IDEMPOTENCY_KEY_HOURS", 24))
+    pruned = IdempotencyKey.query.filter(IdempotencyKey.created_at < cutoff).delete(synchronize_session=False)
+    db.session.commit()
+    return pruned
+
+
+@app.cli.command("prune-idempotency-keys")
+def prune_idempotency_keys_command():
+    """Delete stored API responses older than IDEMPOTENCY_KEY_HOURS."""
+    pruned = prune_idempotency_keys()
+    print(f"✅ Pruned {pruned} expired API idempotency keys")
+
+
+@app.route("/api/v1/clock/<event>", methods=["POST"])
+def api_clock(event):
+    """Record a clock event now and return the entry and totals as JSON.
+
+    Send an Idempotency-Key header to make retries safe: a repeated key
+    returns the first response without recording anything again.
+    """
+    if not current_user.is_authenticated:
+        return jsonify({"error": "Login required"}), 401
+    if event not in CLOCK_EVENT_LOG:
+        return jsonify({"error": "Unknown clock event"}), 404
+
+    key = (request.headers.get("Idempotency-Key") or "").strip()[:100] or None
+    if key:
+        stored = stored_idempotent_response(key)
+        if stored is not None:
+            return stored
+
+    today = date.today()
+    if is_week_locked(current_user.id, today):
+        return idempotent_json(key, {"error": "This week is locked. Contact admin for changes."}, 423, discard=True)
+
+    entry = get_or_create_entry(current_user.id, today)
+    error = apply_clock_event(entry, event, datetime.now())
+    if error:
+        # The blank entry get_or_create_entry may have inserted goes too.
+        return idempotent_json(key, {"error": error, "entry": entry_json(entry)}, 409, discard=True)
+
+    refresh_totals(current_user.id, [today])
+    return idempotent_json(key, {
+        "event": event,
+        "entry": entry_json(entry),
+        "totals": clock_totals_json(current_user.id, today),
+    }, 200)
+
+
+@app.route("/api/v1/clock/batch", methods=["POST"])
+def api_clock_batch():
+    """Replay clock events captured offline, all in one transaction.
+
+    Body: {"events": [{"id": "<client uuid>", "user_id": 7, "event":
+    "clock_in", "at": "<ISO 8601 time with offset>"}, ...]} where user_id is
+    whoever was signed in when the punch was made. Events are applied in
+    time order; each gets a result of applied, rejected (with the reason),
+    duplicate (already applied earlier) or other_user (recorded by someone
+    else on a shared device, so not applied). Clients should drop every
+    event that has a result except other_user ones, which wait for their
+    owner's session.
+    """
+    if not current_user.is_authenticated:
+        return jsonify({"error": "Login required"}), 401
+    events = (request.get_json(silent=True) or {}).get("events")
+    max_events = app.config.get("CLOCK_BATCH_MAX_EVENTS", 200)
+    if not isinstance(events, list) or len(events) > max_events:
+        return jsonify({"error": f"Send a list of up to {max_events} events"}), 400
+
+    now = datetime.now()
+    oldest = now - timedelta(days=app.config.get("CLOCK_BATCH_MAX_AGE_DAYS", 7))
+    results = {}
+    parsed = []
+    for item in events:
+        if not isinstance(item, dict) or not str(item.get("id") or "").strip():
+            return jsonify({"error": "Every event needs an id"}), 400
+        event_id = str(item["id"]).strip()[:80]
+        try:
+            at = datetime.fromisoformat(str(item.get("at")))
+        except ValueError:
+            results[event_id] = {"id": event_id, "status": "rejected", "error": "Invalid time"}
+            continue
+        if at.tzinfo is not None:
+            at = at.astimezone().replace(tzinfo=None)
+        if item.get("event") not in CLOCK_EVENT_LOG:
+            results[event_id] = {"id": event_id, "status": "rejected", "error": "Unknown clock event"}
+        elif at > now + timedelta(minutes=5) or at < oldest:
+            results[event_id] = {"id": event_id, "status": "rejected", "error": "Time is out of range"}
+        elif item.get("user_id") is None:
+            results[event_id] = {"id": event_id, "status": "rejected", "error": "Missing user id"}
+        elif str(item["user_id"]) != str(current_user.id):
+            results[event_id] = {"id": event_id, "status": "other_user", "error": "Recorded by another user"}
+        else:
+            parsed.append((at, event_id, item["event"]))
+
+    keys = {f"clock:{event_id}" for _, event_id, _ in parsed}
+    seen = {
+        key for (key,) in db.session.query(IdempotencyKey.key).filter(
+            IdempotencyKey.user_id == current_user.id,
+            IdempotencyKey.key.in_(keys)
+        )
+    } if keys else set()
+    locked = locked_weeks((current_user.id, get_week_range(at)[0]) for at, _, _ in parsed)
+
+    entries = {}
+    for at, event_id, name in sorted(parsed):
+        key = f"clock:{event_id}"
+        if key in seen or event_id in results:
+            results.setdefault(event_id, {"id": event_id, "status": "duplicate"})
+            continue
+        day = at.date()
+        if (current_user.id, get_week_range(day)[0]) in locked:
+            error = "This week is locked"
+        else:
+            if day not in entries:
+                entries[day] = get_or_create_entry(current_user.id, day)
+            error = apply_clock_event(entries[day], name, at)
+        result = {"id": event_id, "status": "rejected", "error": error} if error else {"id": event_id, "status": "applied"}
+        results[event_id] = result
+        db.session.add(IdempotencyKey(
+            user_id=current_user.id, key=key, status_code=409 if error else 200, response=json.dumps(result)
+        ))
+
+    refresh_totals(current_user.id, entries.keys())
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # The same events are being replayed by another request; retry later.
+        db.session.rollback()
+        return jsonify({"error": "Batch is already being applied, retry"}), 409
+
+    return jsonify({
+        "results": list(results.values()),
+        "entries": {day.isoformat(): entry_json(entry) for day, entry in entries.items()},
+    })
+
+
+# ---------------- SHIFT BOARD ----------------
+SHIFT_BOARD_ACTIONS = tuple(activity for activity, _ in CLOCK_EVENT_LOG.values())
+
+
+class ShiftBoardHub:
+    """Wakes this process's shift-board streams when a clock event commits.
+
+    The events themselves are read from activity_log past each stream's
+    id cursor, so punches recorded by other workers still arrive within
+    SHIFT_BOARD_POLL_SECONDS; local punches arrive immediately. Only
+    SHIFT_BOARD_MAX_STREAMS connections are held open per process, the
+    rest get a snapshot and reconnect later.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._streams = 0
+
+    @property
+    def seq(self):
+        return self._seq
+
+    def notify(self):
+        with self._cond:
+            self._seq += 1
+            self._cond.notify_all()
+
+    def wait(self, seq, timeout):
+        """Block until notify() moves past seq or timeout passes; returns the new seq."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq != seq, timeout)
+            return self._seq
+
+    def acquire(self):
+        with self._cond:
+            if self._streams >= app.config.get("SHIFT_BOARD_MAX_STREAMS", 4):
+                return False
+            self._streams += 1
+            return True
+
+    def release(self):
+        with self._cond:
+            self._streams -= 1
+
+
+shift_board = ShiftBoardHub()
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_shift_board(session):
+    if session.info.pop("clock_event", False):
+        shift_board.notify()
+
+
+def can_hold_connection(environ):
+    """True when parking this request will not block other requests.
+
+    gthread workers serve each request on its own thread and gevent workers
+    on a greenlet; a sync worker would be stuck for the whole stream.
+    """
+    if environ.get("wsgi.multithread"):
+        return True
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched("socket")
+
+
+def shift_board_rows(user_ids=None):
+    """Board rows for today's open entries, keyed by user id."""
+    users = get_user_directory()
+    query = db.session.query(
+        TimeEntry.user_id, TimeEntry.clock_in, TimeEntry.lunch_start,
+        TimeEntry.lunch_end, TimeEntry.dinner_start, TimeEntry.dinner_end
+    ).filter(
+        TimeEntry.day == date.today(),
+        TimeEntry.clock_in.isnot(None),
+        TimeEntry.clock_out.is_(None)
+    )
+    if user_ids is not None:
+        query = query.filter(TimeEntry.user_id.in_(user_ids))
+    rows = {}
+    for user_id, clock_in, lunch_start, lunch_end, dinner_start, dinner_end in query:
+        user = users.get(user_id)
+        rows[user_id] = {
+            "user_id": user_id,
+            "name": user.name if user else f"User {user_id}",
+            "department": user.department if user else None,
+            "since": clock_in.isoformat(),
+            "on_break": bool((lunch_start and not lunch_end) or (dinner_start and not dinner_end)),
+        }
+    return rows
+
+
+def shift_board_snapshot():
+    """Everyone clocked in today and not yet out, with their break state."""
+    return sorted(shift_board_rows().values(), key=lambda row: row["name"])
+
+
+def shift_board_events(after_id, skip=frozenset()):
+    """Clock events logged after activity_log id after_id, oldest first.
+
+    Each event carries the user's board row as it stands now ("row", None
+    when they are off shift) rather than only the action, so a punch
+    replayed for an earlier day from an offline queue leaves today's board
+    as it is. Ids in skip (already sent) are left out.
+    """
+    users = get_user_directory()
+    logs = [
+        row for row in db.session.query(
+            ActivityLog.id, ActivityLog.user_id, ActivityLog.action, ActivityLog.timestamp
+        ).filter(
+            ActivityLog.id > after_id,
+            ActivityLog.action.in_(SHIFT_BOARD_ACTIONS)
+        ).order_by(ActivityLog.id).limit(500 + len(skip))
+        if row.id not in skip
+    ][:500]
+    current = shift_board_rows({row.user_id for row in logs}) if logs else {}
+    events = []
+    for log_id, user_id, activity, timestamp in logs:
+        user = users.get(user_id)
+        events.append({
+            "id": log_id,
+            "user_id": user_id,
+            "name": user.name if user else f"User {user_id}",
+            "department": user.department if user else None,
+            "action": activity,
+            "at": timestamp.isoformat() if timestamp else None,
+            "row": current.get(user_id),
+        })
+    return events
+
+
+def sse_message(event_name, data):
+    return f"event: {event_name}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.route("/admin/shift-board")
+@login_required
+def shift_board_page():
+    if current_user.role != 'admin' and not current_user.is_admin:
+        flash("❌ Access denied", "danger")
+        return redirect("/dashboard")
+    return render_template("shift_board.html")
+
+
+@app.route("/admin/shift-board/stream")
+@login_required
+def shift_board_stream():
+    """Server-sent events for the shift board.
+
+    Sends a "snapshot" of who is on shift, then a "clock" event per punch
+    for up to SHIFT_BOARD_STREAM_SECONDS, after which the browser
+    reconnects and gets a fresh snapshot. On sync workers (or when too many
+    boards are open) the stream closes after the snapshot and the browser
+    polls every SHIFT_BOARD_POLL_SECONDS instead.
+
+    On PostgreSQL an id is taken at INSERT, so a row can commit after one
+    with a higher id. Each read therefore starts SHIFT_BOARD_ID_OVERLAP ids
+    below the newest one sent and skips ids already sent.
+    """
+    if current_user.role != 'admin' and not current_user.is_admin:
+        return jsonify({"error": "Access denied"}), 403
+
+    poll = app.config.get("SHIFT_BOARD_POLL_SECONDS", 5)
+    overlap = app.config.get("SHIFT_BOARD_ID_OVERLAP", 500)
+    hold = can_hold_connection(request.environ) and shift_board.acquire()
+    try:
+        cursor = db.session.query(func.max(ActivityLog.id)).scalar() or 0
+        # Events already visible now are part of the snapshot.
+        sent = set(db.session.scalars(select(ActivityLog.id).where(
+            ActivityLog.id > cursor - overlap,
+            ActivityLog.action.in_(SHIFT_BOARD_ACTIONS)
+        )))
+        snapshot = shift_board_snapshot()
+    except Exception:
+        if hold:
+            shift_board.release()
+        raise
+    finally:
+        # Don't pin a pooled connection for the life of the stream.
+        db.session.close()
+
+    def generate():
+        yield f"retry: {int(poll * 1000)}\n\n"
+        yield sse_message("snapshot", snapshot)
+        if not hold:
+            return
+        last_seen = cursor
+        seq = shift_board.seq
+        deadline = time.monotonic() + app.config.get("SHIFT_BOARD_STREAM_SECONDS", 300)
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            seq = shift_board.wait(seq, min(poll, remaining))
+            try:
+                events = shift_board_events(last_seen - overlap, sent)
+            finally:
+                db.session.close()
+            for item in events:
+                sent.add(item["id"])
+                last_seen = max(last_seen, item["id"])
+                yield sse_message("clock", item)
+            sent.difference_update([log_id for log_id in sent if log_id <= last_seen - overlap])
+            if not events:
+                # Comment line: keeps proxies from timing the stream out.
+                yield ": keep-alive\n\n"
+
+    response = Response(stream_with_context(generate()), mimetype="text/event-stream")
+    if hold:
+        # Runs when the server closes the response, even if the client left early.
+        response.call_on_close(shift_board.release)
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+
+@app.route("/sw.js")
+def service_worker():
+    """Serve the service worker from the root so it controls every page."""
+    response = send_file(os.path.join(app.static_folder, "sw.js"), mimetype="application/javascript")
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
 if __name__ == "__main__":
     app.run(debug=app.config.get("DEBUG", False))
@@ -2,11 +2,50 @@ import os
 
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 
+
+def _database_url():
+    url = os.getenv("DATABASE_URL") or "sqlite:///" + os.path.join(BASE_DIR, "timetracker.db")
+    # Heroku-style URLs use the scheme SQLAlchemy dropped in 1.4.
+    if url.startswith("postgres://"):
+        url = "postgresql://" + url[len("postgres://"):]
+    return url
+
+
+def _engine_options(url):
+    """Connection pool settings for the configured database.
+
+    SQLite connection PRAGMAs are applied in app.py on every new connection;
+    here we only size the pool and set the driver-level lock timeout.
+    """
+    options = {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+    }
+    if url.startswith("sqlite"):
+        if ":memory:" in url or url.rstrip("/") == "sqlite:":
+            return {}
+        options["connect_args"] = {
+            "timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")) / 1000,
+        }
+    else:
+        options["pool_pre_ping"] = True
+        options["pool_recycle"] = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    return options
+
 class Config:
     SECRET_KEY = os.getenv("SECRET_KEY")
-    SQLALCHEMY_DATABASE_URI = "sqlite:///" + os.path.join(BASE_DIR, "timetracker.db")
+    SQLALCHEMY_DATABASE_URI = _database_url()
+    SQLALCHEMY_ENGINE_OPTIONS = _engine_options(SQLALCHEMY_DATABASE_URI)
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "20000"))
+    SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(128 * 1024 * 1024)))
+    SQLITE_TEMP_STORE = os.getenv("SQLITE_TEMP_STORE", "MEMORY")
     DEBUG = os.getenv("FLASK_DEBUG", "false").lower() == "true"
+    MAIL_ENABLED = os.getenv("MAIL_ENABLED", "true").lower() == "true"
     MAIL_SERVER = os.getenv("MAIL_SERVER")
     MAIL_PORT = int(os.getenv("MAIL_PORT", "587"))
     MAIL_USERNAME = os.getenv("MAIL_USERNAME")
@@ -14,9 +53,35 @@ class Config:
     MAIL_USE_TLS = os.getenv("MAIL_USE_TLS", "true").lower() == "true"
     MAIL_USE_SSL = os.getenv("MAIL_USE_SSL", "false").lower() == "true"
     MAIL_FROM = os.getenv("MAIL_FROM")
+    MAIL_TIMEOUT = float(os.getenv("MAIL_TIMEOUT", "10"))
+    MAIL_WORKERS = int(os.getenv("MAIL_WORKERS", "2"))
+    MAIL_BATCH_SIZE = int(os.getenv("MAIL_BATCH_SIZE", "20"))
+    MAIL_MAX_ATTEMPTS = int(os.getenv("MAIL_MAX_ATTEMPTS", "5"))
+    MAIL_RETRY_SECONDS = float(os.getenv("MAIL_RETRY_SECONDS", "30"))
+    MAIL_POLL_SECONDS = float(os.getenv("MAIL_POLL_SECONDS", "10"))
+    MAIL_IDLE_SECONDS = float(os.getenv("MAIL_IDLE_SECONDS", "60"))
+    MAIL_CLAIM_TIMEOUT = float(os.getenv("MAIL_CLAIM_TIMEOUT", "300"))
     SMS_ENABLED = os.getenv("SMS_ENABLED", "false").lower() == "true"
     INIT_ENABLED = os.getenv("INIT_ENABLED", "false").lower() == "true"
     INIT_TOKEN = os.getenv("INIT_TOKEN")
     AUTO_SEED_ON_EMPTY = os.getenv("AUTO_SEED_ON_EMPTY", "true").lower() == "true"
     SHOW_RESET_LINK = os.getenv("SHOW_RESET_LINK", "false").lower() == "true"
+    ACTIVITY_LOG_BUFFERED = os.getenv("ACTIVITY_LOG_BUFFERED", "false").lower() == "true"
+    ACTIVITY_LOG_FLUSH_SECONDS = float(os.getenv("ACTIVITY_LOG_FLUSH_SECONDS", "2"))
+    ACTIVITY_LOG_BATCH_SIZE = int(os.getenv("ACTIVITY_LOG_BATCH_SIZE", "200"))
+    CACHE_CHECK_SECONDS = float(os.getenv("CACHE_CHECK_SECONDS", "5"))
+    USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1000"))
+    REPORT_CACHE_SIZE = int(os.getenv("REPORT_CACHE_SIZE", "64"))
+    AUDIT_PAGE_SIZE = int(os.getenv("AUDIT_PAGE_SIZE", "100"))
+    IDEMPOTENCY_KEY_HOURS = int(os.getenv("IDEMPOTENCY_KEY_HOURS", "24"))
+    CLOCK_BATCH_MAX_EVENTS = int(os.getenv("CLOCK_BATCH_MAX_EVENTS", "200"))
+    CLOCK_BATCH_MAX_AGE_DAYS = int(os.getenv("CLOCK_BATCH_MAX_AGE_DAYS", "7"))
+    APPROVAL_PAGE_SIZE = int(os.getenv("APPROVAL_PAGE_SIZE", "100"))
+    SHIFT_BOARD_STREAM_SECONDS = float(os.getenv("SHIFT_BOARD_STREAM_SECONDS", "300"))
+    SHIFT_BOARD_POLL_SECONDS = float(os.getenv("SHIFT_BOARD_POLL_SECONDS", "5"))
+    SHIFT_BOARD_MAX_STREAMS = int(os.getenv("SHIFT_BOARD_MAX_STREAMS", "4"))
+    SHIFT_BOARD_ID_OVERLAP = int(os.getenv("SHIFT_BOARD_ID_OVERLAP", "500"))
+    ACTIVITY_LOG_RETENTION_DAYS = int(os.getenv("ACTIVITY_LOG_RETENTION_DAYS", "180"))
+    ACTIVITY_LOG_ARCHIVE_DIR = os.getenv("ACTIVITY_LOG_ARCHIVE_DIR", os.path.join(BASE_DIR, "archive", "activity_log"))
+    ACTIVITY_LOG_ARCHIVE_BATCH = int(os.getenv("ACTIVITY_LOG_ARCHIVE_BATCH", "2000"))
 
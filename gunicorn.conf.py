@@ -0,0 +1,62 @@
+"""Gunicorn settings for the time tracker.
+
+The default profile is gthread: a few worker processes, each serving
+requests on a thread pool, so a slow SMTP server or a long payroll export
+ties up one thread rather than a whole worker. Set
+GUNICORN_WORKER_CLASS=gevent (and pip install gevent) for the cooperative
+profile; preloading is then disabled so gevent can patch the standard
+library before the app is imported. With SQLite, prefer gthread: the
+sqlite3 driver blocks the gevent loop while it waits for the write lock.
+"""
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "200"))
+
+# Exports stream for a while; a worker is only killed after it stops
+# responding to the arbiter for this long.
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "2000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "200"))
+
+preload_app = (
+    os.getenv("GUNICORN_PRELOAD", "true").lower() == "true"
+    and worker_class != "gevent"
+)
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-")
+
+
+def on_starting(server):
+    """Migrate once in the master so workers start with a current schema."""
+    if not server.cfg.preload_app:
+        return
+    from app import app, db, run_migrations
+    with app.app_context():
+        applied = run_migrations()
+        app.config["SCHEMA_READY"] = True
+        db.engine.dispose()
+    if applied:
+        server.log.info("Applied migrations: %s", ", ".join(str(v) for v in applied))
+
+
+def post_fork(server, worker):
+    """Give each worker its own connection pool instead of the master's."""
+    if not server.cfg.preload_app:
+        return
+    from app import app, db
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+
+def post_worker_init(worker):
+    """Start the mail pool now rather than on the first queued email, so
+    mail left pending or mid-send by a recycled worker goes out promptly."""
+    from app import mail_queue
+    mail_queue.ensure_started()
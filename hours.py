@@ -0,0 +1,104 @@
+"""Work, break and overtime minutes for time entries.
+
+The scalar helpers handle one entry; entry_minutes() handles a whole batch
+of (clock_in, clock_out, lunch_start, lunch_end, dinner_start, dinner_end)
+tuples at once with NumPy, falling back to the scalar helpers when NumPy is
+not installed. Both follow the same rules: a missing timestamp counts as
+zero, and an end earlier than its start wraps past midnight.
+
+With NumPy the timestamps may also be ISO strings as stored by SQLite,
+which parse much faster than datetime objects convert.
+"""
+from datetime import datetime, timedelta
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional speed-up
+    np = None
+
+HAVE_NUMPY = np is not None
+
+TIME_FIELDS = ("clock_in", "clock_out", "lunch_start", "lunch_end", "dinner_start", "dinner_end")
+
+_US_PER_MINUTE = 60 * 1_000_000
+_US_PER_DAY = 24 * 60 * _US_PER_MINUTE
+_EPOCH = datetime(1970, 1, 1)
+_ONE_US = timedelta(microseconds=1)
+_NAT = -2 ** 63
+
+
+def minutes(a, b):
+    if not a or not b:
+        return 0
+    if b < a:
+        b = b + timedelta(days=1)
+    return int((b - a).total_seconds() // 60)
+
+
+def work_and_break_minutes(entry):
+    break_mins = minutes(entry.lunch_start, entry.lunch_end) + minutes(entry.dinner_start, entry.dinner_end)
+    work_mins = minutes(entry.clock_in, entry.clock_out) - break_mins
+    if work_mins < 0:
+        work_mins = 0
+    return work_mins, break_mins
+
+
+def entry_times(entry):
+    """The TIME_FIELDS of an entry (ORM object or named row) as a tuple."""
+    return tuple(getattr(entry, field) for field in TIME_FIELDS)
+
+
+def _as_datetime64(values):
+    """One timestamp column as datetime64[us]; None becomes NaT.
+
+    NumPy parses ISO strings quickly but converts datetime objects (and
+    None) slowly, so datetimes go through integer microseconds instead.
+    """
+    sample = next((value for value in values if value is not None), None)
+    if isinstance(sample, datetime):
+        return np.array(
+            [(value - _EPOCH) // _ONE_US if value is not None else _NAT for value in values],
+            dtype=np.int64
+        ).view("datetime64[us]")
+    return np.array([value if value is not None else "NaT" for value in values], dtype="datetime64[us]")
+
+
+def _span_minutes(start, end):
+    """Vectorized minutes() over two datetime64[us] columns."""
+    valid = ~(np.isnat(start) | np.isnat(end))
+    span = (end - start).astype(np.int64)
+    span = np.where(span < 0, span + _US_PER_DAY, span)
+    return np.where(valid, span // _US_PER_MINUTE, 0)
+
+
+def entry_minutes(rows, overtime_after=None):
+    """Work, break and overtime minutes for many entries in one pass.
+
+    rows is a sequence of TIME_FIELDS tuples. overtime_after is the daily
+    threshold in minutes; without it overtime is all zeros. Returns three
+    lists of ints in row order.
+    """
+    rows = list(rows)
+    if not rows:
+        return [], [], []
+
+    if np is None:
+        work, breaks = [], []
+        for row in rows:
+            clock_in, clock_out, lunch_start, lunch_end, dinner_start, dinner_end = row
+            break_mins = minutes(lunch_start, lunch_end) + minutes(dinner_start, dinner_end)
+            work.append(max(0, minutes(clock_in, clock_out) - break_mins))
+            breaks.append(break_mins)
+        if overtime_after is None:
+            return work, breaks, [0] * len(rows)
+        return work, breaks, [max(0, w - overtime_after) for w in work]
+
+    columns = [_as_datetime64(col) for col in zip(*rows)]
+    clock_in, clock_out, lunch_start, lunch_end, dinner_start, dinner_end = columns
+    breaks = _span_minutes(lunch_start, lunch_end) + _span_minutes(dinner_start, dinner_end)
+    work = np.maximum(_span_minutes(clock_in, clock_out) - breaks, 0)
+    if overtime_after is None:
+        overtime = np.zeros_like(work)
+    else:
+        overtime = np.maximum(work - overtime_after, 0)
+    return work.tolist(), breaks.tolist(), overtime.tolist()
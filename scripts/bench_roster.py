@@ -0,0 +1,110 @@
+"""Roster grid save benchmark: per-cell queries vs the bulk save.
+
+For each staff size, posts a full week's grid (staff x 7 cells) three
+times: a first save into an empty week, an unchanged re-save, and a save
+with one changed cell. The old save (a Roster SELECT per cell, then
+rewrite every cell) is replayed from the same form data next to the
+current /roster-admin POST. Reports query count and latency for each.
+
+    python scripts/bench_roster.py --staff 10,100,500
+
+Without DATABASE_URL a throwaway SQLite file is used.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--staff", default="10,100,500", help="comma-separated staff counts")
+    args = parser.parse_args()
+
+    if not os.getenv("DATABASE_URL"):
+        fd, path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        os.unlink(path)
+        os.environ["DATABASE_URL"] = "sqlite:///" + path
+
+    from sqlalchemy import event
+    from werkzeug.security import generate_password_hash
+    from app import app, db, Roster, User, get_week_range, run_migrations, user_changed, invalidate_user
+
+    app.config["TESTING"] = True
+    app.secret_key = app.secret_key or "bench-roster"
+    queries = [0]
+    with app.app_context():
+        run_migrations()
+        admin = User(name=f"bench-admin-{os.getpid()}", password=generate_password_hash("bench"),
+                     role="admin", is_admin=True, is_active=True, is_staff=False)
+        db.session.add(admin)
+        db.session.commit()
+        admin_name = admin.name
+        event.listen(db.engine, "before_cursor_execute", lambda *a: queries.__setitem__(0, queries[0] + 1))
+
+    client = app.test_client()
+    client.post("/login", data={"name": admin_name, "password": "bench"})
+
+    def legacy_save(staff, form, week_start):
+        week_end = week_start + timedelta(days=6)
+        for user_id, position in staff:
+            for day in DAYS:
+                is_off = form.get(f"off_{user_id}_{day}") == "1"
+                roster = Roster.query.filter_by(user_id=user_id, day_of_week=day, week_start=week_start).first()
+                if not roster:
+                    roster = Roster(user_id=user_id, day_of_week=day, week_start=week_start, week_end=week_end)
+                    db.session.add(roster)
+                roster.is_off = is_off
+                roster.start_time = None if is_off else form.get(f"start_{user_id}_{day}")
+                roster.end_time = None if is_off else form.get(f"end_{user_id}_{day}")
+                roster.notes = form.get(f"notes_{user_id}_{day}")
+                roster.role_title = position
+        db.session.commit()
+
+    def timed(run):
+        queries[0] = 0
+        began = time.perf_counter()
+        run()
+        return queries[0], time.perf_counter() - began
+
+    print(f"{'staff':>5} {'save':>10} {'old queries':>12} {'old ms':>8} {'new queries':>12} {'new ms':>8}")
+    week = get_week_range()[0]
+    for count in (int(n) for n in args.staff.split(",")):
+        with app.app_context():
+            # Only this round's staff appear on the grid.
+            User.query.filter(User.is_staff == True).update({User.is_staff: False})
+            users = [User(name=f"bench-{count}-{i}", password="x", is_staff=True, is_active=True,
+                          position="Waiter") for i in range(count)]
+            db.session.add_all(users)
+            user_changed()
+            db.session.commit()
+            invalidate_user()
+            staff = [(user.id, user.position) for user in users]
+
+            form = {"week_start": ""}
+            for user_id, _ in staff:
+                for day in DAYS:
+                    form[f"start_{user_id}_{day}"] = "09:00"
+                    form[f"end_{user_id}_{day}"] = "17:00"
+            changed = dict(form, **{f"end_{staff[0][0]}_Monday": "18:00"})
+
+            # Each round uses two fresh weeks so old and new both start empty.
+            week += timedelta(days=14)
+            old_week, new_week = week, week + timedelta(days=7)
+            for label, data in (("first", form), ("unchanged", form), ("one cell", changed)):
+                old = timed(lambda: legacy_save(staff, data, old_week))
+                new = timed(lambda: client.post(
+                    "/roster-admin", data=dict(data, week_start=new_week.isoformat())
+                ))
+                print(f"{count:5d} {label:>10} {old[0]:12d} {old[1] * 1000:8.1f} {new[0]:12d} {new[1] * 1000:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Weekly summary benchmark: per-user queries vs summarize_hours().
+
+Seeds N users with M weeks of time entries, then builds this week's
+work/break/lock summary for everyone twice: the old way (one TimeEntry
+query and one week-lock query per user) and with summarize_hours() (one
+grouped query over the daily totals plus one lock query). Reports query
+count and latency for each and checks both give the same totals.
+
+    python scripts/bench_summary.py --users 400 --weeks 12
+
+Without DATABASE_URL a throwaway SQLite file is used.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=400)
+    parser.add_argument("--weeks", type=int, default=12)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if not os.getenv("DATABASE_URL"):
+        fd, path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        os.unlink(path)
+        os.environ["DATABASE_URL"] = "sqlite:///" + path
+
+    from sqlalchemy import event
+    from app import (
+        app, db, User, TimeEntry, get_week_range, is_week_locked, rebuild_totals,
+        run_migrations, summarize_hours, work_and_break_minutes
+    )
+
+    with app.app_context():
+        run_migrations()
+        prefix = f"bench-{os.getpid()}-"
+        db.session.execute(User.__table__.insert(), [
+            dict(name=f"{prefix}{i}", password="x", role="employee", is_active=True)
+            for i in range(args.users)
+        ])
+        user_ids = [uid for (uid,) in db.session.query(User.id).filter(User.name.like(f"{prefix}%"))]
+        today = date.today()
+        rows = []
+        for uid in user_ids:
+            for offset in range(args.weeks * 7):
+                day = today - timedelta(days=offset)
+                clock_in = datetime.combine(day, datetime.min.time()).replace(hour=9)
+                rows.append(dict(
+                    user_id=uid, day=day, clock_in=clock_in,
+                    clock_out=clock_in + timedelta(hours=8, minutes=offset % 50),
+                    lunch_start=clock_in + timedelta(hours=3),
+                    lunch_end=clock_in + timedelta(hours=3, minutes=45)
+                ))
+        for i in range(0, len(rows), 20000):
+            db.session.execute(TimeEntry.__table__.insert(), rows[i:i + 20000])
+        db.session.commit()
+        with db.engine.begin() as conn:
+            rebuild_totals(conn)
+
+        queries = [0]
+        event.listen(db.engine, "before_cursor_execute", lambda *a: queries.__setitem__(0, queries[0] + 1))
+        w_start, w_end = get_week_range()
+
+        def per_user():
+            summary = {}
+            for uid in user_ids:
+                entries = TimeEntry.query.filter(
+                    TimeEntry.user_id == uid, TimeEntry.day >= w_start, TimeEntry.day <= w_end
+                ).all()
+                work = breaks = 0
+                for entry in entries:
+                    if entry.clock_in:
+                        work_mins, break_mins = work_and_break_minutes(entry)
+                        work += work_mins
+                        breaks += break_mins
+                summary[uid] = (work, breaks, is_week_locked(uid, w_start))
+            return summary
+
+        def grouped():
+            return {
+                uid: (row["work"], row["break"], row["locked"])
+                for uid, row in summarize_hours(user_ids, w_start, w_end).items()
+            }
+
+        print(f"database: {db.engine.url.render_as_string(hide_password=True)}")
+        print(f"users: {args.users}  weeks: {args.weeks}  entries: {len(rows)}")
+        results = {}
+        for name, build in (("per-user", per_user), ("summarize_hours", grouped)):
+            timings = []
+            for _ in range(args.repeat):
+                db.session.expire_all()
+                queries[0] = 0
+                began = time.perf_counter()
+                results[name] = build()
+                timings.append(time.perf_counter() - began)
+            print(f"{name:>16}: {queries[0]:5d} queries  {min(timings) * 1000:8.1f} ms (best of {args.repeat})")
+        print("totals match" if results["per-user"] == results["summarize_hours"] else "TOTALS DIFFER")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Concurrent-writer benchmark for the database profile.
+
+Starts several processes that each record time entries the way the clock
+actions do (read the day's entry, write it, refresh the totals, commit) and
+reports throughput, commit latency and lock errors.
+
+    python scripts/bench_writers.py --writers 8 --entries 200
+    SQLITE_JOURNAL_MODE=DELETE SQLITE_SYNCHRONOUS=FULL python scripts/bench_writers.py
+
+Without DATABASE_URL a throwaway SQLite file is used.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def writer(user_id, entries, start, results):
+    from sqlalchemy.exc import OperationalError
+    from app import app, db, TimeEntry, refresh_totals
+
+    latencies, errors = [], 0
+    with app.app_context():
+        start.wait()
+        first_day = date.today() - timedelta(days=entries)
+        for i in range(entries):
+            day = first_day + timedelta(days=i)
+            began = time.perf_counter()
+            try:
+                entry = TimeEntry.query.filter_by(user_id=user_id, day=day).first()
+                if not entry:
+                    entry = TimeEntry(user_id=user_id, day=day)
+                    db.session.add(entry)
+                entry.clock_in = datetime.combine(day, datetime.min.time()).replace(hour=9)
+                entry.clock_out = entry.clock_in + timedelta(hours=8)
+                refresh_totals(user_id, [day])
+                db.session.commit()
+                latencies.append(time.perf_counter() - began)
+            except OperationalError:
+                db.session.rollback()
+                errors += 1
+        db.session.remove()
+    results.put((latencies, errors))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--entries", type=int, default=200)
+    args = parser.parse_args()
+
+    if not os.getenv("DATABASE_URL"):
+        fd, path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        os.unlink(path)
+        os.environ["DATABASE_URL"] = "sqlite:///" + path
+
+    from app import app, db, User, run_migrations
+    with app.app_context():
+        run_migrations()
+        users = [User(name=f"bench-{os.getpid()}-{i}", password="x") for i in range(args.writers)]
+        db.session.add_all(users)
+        db.session.commit()
+        user_ids = [user.id for user in users]
+        url = db.engine.url.render_as_string(hide_password=True)
+        pragmas = ""
+        if db.engine.dialect.name == "sqlite":
+            with db.engine.connect() as conn:
+                pragmas = ", ".join(
+                    f"{name}={conn.exec_driver_sql(f'PRAGMA {name}').scalar()}"
+                    for name in ("journal_mode", "synchronous", "busy_timeout")
+                )
+        db.engine.dispose()
+
+    ctx = multiprocessing.get_context("fork")
+    start = ctx.Event()
+    results = ctx.Queue()
+    procs = [ctx.Process(target=writer, args=(uid, args.entries, start, results)) for uid in user_ids]
+    for proc in procs:
+        proc.start()
+    time.sleep(1)
+    began = time.perf_counter()
+    start.set()
+    latencies, errors = [], 0
+    for _ in procs:
+        proc_latencies, proc_errors = results.get()
+        latencies.extend(proc_latencies)
+        errors += proc_errors
+    elapsed = time.perf_counter() - began
+    for proc in procs:
+        proc.join()
+
+    print(f"database: {url} {pragmas}")
+    print(f"writers: {args.writers}  commits: {len(latencies)}  lock errors: {errors}")
+    print(f"throughput: {len(latencies) / elapsed:.0f} commits/s over {elapsed:.2f}s")
+    print("latency ms: p50 {:.1f}  p95 {:.1f}  p99 {:.1f}".format(
+        *(percentile(latencies, pct) * 1000 for pct in (50, 95, 99))
+    ))
+
+
+if __name__ == "__main__":
+    main()
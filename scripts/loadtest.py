@@ -0,0 +1,114 @@
+"""Replay employee clock flows against a running server and report latency.
+
+Each virtual user runs login -> clock_in -> dashboard -> clock_out in a
+loop on its own thread and cookie jar. Redirects are not followed, so each
+step is timed on its own.
+
+    gunicorn -c gunicorn.conf.py app:app &
+    python scripts/loadtest.py --url http://127.0.0.1:8000 --concurrency 9 --iterations 20
+
+Users default to the demo accounts; pass --users name:password,... for others.
+After the first iteration clock_in answers "already clocked in", while
+clock_out keeps writing the entry, its totals and the summary email.
+"""
+import argparse
+import http.cookiejar
+import os
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+DEMO_USERS = [
+    ("Abhi", "abhi123"), ("Rutul", "rutul123"), ("Geetika", "geetika123"),
+    ("Palpasa", "palpasa123"), ("Aman", "aman123"), ("Udita", "udita123"),
+    ("Sneha", "sneha123"), ("Suraj", "suraj123"), ("Rohisa", "rohisa123"),
+]
+STEPS = ["login", "clock_in", "dashboard", "clock_out"]
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def virtual_user(base_url, name, password, iterations, timings, errors, lock):
+    opener = urllib.request.build_opener(
+        urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect()
+    )
+    requests = {
+        "login": ("/login", {"name": name, "password": password}),
+        "clock_in": ("/action/clock_in", {}),
+        "dashboard": ("/dashboard", None),
+        "clock_out": ("/action/clock_out", {}),
+    }
+    for _ in range(iterations):
+        for step in STEPS:
+            path, form = requests[step]
+            data = urllib.parse.urlencode(form).encode() if form is not None else None
+            started = time.perf_counter()
+            try:
+                with opener.open(base_url + path, data=data, timeout=30) as response:
+                    response.read()
+                    ok = response.status < 400
+            except urllib.error.HTTPError as e:
+                ok = e.code < 400  # 3xx surface as HTTPError without a redirect handler
+            except OSError:
+                ok = False
+            elapsed = time.perf_counter() - started
+            with lock:
+                timings[step].append(elapsed)
+                if not ok:
+                    errors[step] += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default=os.getenv("LOADTEST_URL", "http://127.0.0.1:8000"))
+    parser.add_argument("--concurrency", type=int, default=9)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--users", help="comma-separated name:password pairs")
+    args = parser.parse_args()
+
+    users = DEMO_USERS
+    if args.users:
+        users = [tuple(pair.split(":", 1)) for pair in args.users.split(",")]
+
+    timings = {step: [] for step in STEPS}
+    errors = {step: 0 for step in STEPS}
+    lock = threading.Lock()
+    threads = [
+        threading.Thread(target=virtual_user, args=(
+            args.url.rstrip("/"), *users[i % len(users)], args.iterations, timings, errors, lock
+        ))
+        for i in range(args.concurrency)
+    ]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    total = sum(len(v) for v in timings.values())
+    print(f"{total} requests in {elapsed:.2f}s ({total / elapsed:.0f} req/s), "
+          f"{args.concurrency} users x {args.iterations} flows")
+    print(f"{'step':<10} {'count':>6} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for step in STEPS + ["all"]:
+        values = timings[step] if step != "all" else [v for vs in timings.values() for v in vs]
+        failed = errors[step] if step != "all" else sum(errors.values())
+        print(f"{step:<10} {len(values):>6} {failed:>6} " + " ".join(
+            f"{percentile(values, pct) * 1000:>8.1f}" for pct in (50, 95, 99)
+        ))
+
+
+if __name__ == "__main__":
+    main()
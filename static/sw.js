@@ -1,14 +1,138 @@
-const CACHE_NAME = "timetracker-v1";
-const CORE_ASSETS = [
-  "/",
-  "/login",
+const CACHE_NAME = "timetracker-v3";
+const STATIC_ASSETS = [
   "/static/manifest.json",
   "/static/default-avatar.svg"
 ];
+// Only shown when a page cannot be reached; pages always come from the network.
+const OFFLINE_PAGE = "/login";
+
+// Clock punches made while offline are kept in IndexedDB and replayed
+// through /api/v1/clock/batch once the network is back.
+const DB_NAME = "timetracker";
+const QUEUE_STORE = "clock-events";
+const SYNC_TAG = "clock-sync";
+const CLOCK_PATH = /^\/(?:action|api\/v1\/clock)\/(clock_in|lunch_start|lunch_end|dinner_start|dinner_end|clock_out)$/;
+
+function openQueue() {
+  return new Promise((resolve, reject) => {
+    const request = indexedDB.open(DB_NAME, 1);
+    request.onupgradeneeded = () => request.result.createObjectStore(QUEUE_STORE, { keyPath: "id" });
+    request.onsuccess = () => resolve(request.result);
+    request.onerror = () => reject(request.error);
+  });
+}
+
+function queueTransaction(mode, work) {
+  return openQueue().then((db) => new Promise((resolve, reject) => {
+    const tx = db.transaction(QUEUE_STORE, mode);
+    const result = work(tx.objectStore(QUEUE_STORE));
+    tx.oncomplete = () => resolve(result && "result" in result ? result.result : undefined);
+    tx.onerror = () => reject(tx.error);
+  }));
+}
+
+function requestUserId(request) {
+  // The clock forms (and JSON bodies) say whose punch it is, so a punch
+  // made on a shared device is never replayed under the next user.
+  const type = request.headers.get("Content-Type") || "";
+  const body = type.includes("application/json")
+    ? request.clone().json()
+    : request.clone().formData().then((form) => ({ user_id: form.get("user_id") }));
+  return body.then((data) => (data && data.user_id ? String(data.user_id) : null), () => null);
+}
+
+function queueClockEvent(name, userId) {
+  const item = { id: self.crypto.randomUUID(), user_id: userId, event: name, at: new Date().toISOString() };
+  return queueTransaction("readwrite", (store) => store.put(item)).then(() => {
+    if (self.registration.sync) {
+      self.registration.sync.register(SYNC_TAG).catch(() => {});
+    }
+    return item;
+  });
+}
+
+let flushing = null;
+
+function flushQueue(userId) {
+  // One flush at a time; later callers share the running one.
+  if (!flushing) {
+    flushing = doFlush(userId).finally(() => { flushing = null; });
+  }
+  return flushing;
+}
+
+function doFlush(userId) {
+  // With a user id (from a signed-in page) only that user's punches are
+  // sent; background sync sends everything and lets the server sort it out.
+  return queueTransaction("readonly", (store) => store.getAll()).then((queued) => {
+    const events = (queued || []).filter((item) => !userId || item.user_id === userId);
+    if (!events.length) {
+      return;
+    }
+    return fetch("/api/v1/clock/batch", {
+      method: "POST",
+      credentials: "same-origin",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ events: events.slice(0, 200) })
+    }).then((response) => {
+      if (!response.ok) {
+        throw new Error(`Clock sync failed: ${response.status}`);
+      }
+      return response.json();
+    }).then((data) => {
+      // Every event with a result is settled, including rejected ones,
+      // except punches another user made, which wait for their session.
+      const settled = data.results.filter((result) => result.status !== "other_user");
+      return queueTransaction("readwrite", (store) => {
+        settled.forEach((result) => store.delete(result.id));
+      }).then(() => {
+        if (events.length > 200 && settled.length) {
+          return doFlush(userId);
+        }
+      });
+    });
+  });
+}
+
+function offlineResponse(url, item) {
+  if (!item) {
+    // Without an owner the punch cannot be replayed safely, so it is not kept.
+    if (url.pathname.startsWith("/api/")) {
+      return new Response(JSON.stringify({ error: "Offline: send user_id to queue this punch" }), {
+        status: 503,
+        headers: { "Content-Type": "application/json" }
+      });
+    }
+    return new Response(
+      `<!doctype html><meta name="viewport" content="width=device-width, initial-scale=1">` +
+      `<p style="font-family:sans-serif;padding:2rem">You're offline and this punch could not be saved. ` +
+      `Please try again when the connection returns.</p>`,
+      { status: 503, headers: { "Content-Type": "text/html; charset=utf-8" } }
+    );
+  }
+  if (url.pathname.startsWith("/api/")) {
+    return new Response(JSON.stringify({ queued: true, id: item.id, event: item.event, at: item.at }), {
+      status: 202,
+      headers: { "Content-Type": "application/json" }
+    });
+  }
+  const label = item.event.replace(/_/g, " ");
+  return new Response(
+    `<!doctype html><meta name="viewport" content="width=device-width, initial-scale=1">` +
+    `<p style="font-family:sans-serif;padding:2rem">You're offline. Your <strong>${label}</strong> ` +
+    `at ${new Date(item.at).toLocaleTimeString([], { hour: "2-digit", minute: "2-digit" })} was saved on this device and will be sent when the connection returns.</p>` +
+    `<p style="font-family:sans-serif;padding:0 2rem"><a href="/dashboard">Back to dashboard</a></p>`,
+    { status: 200, headers: { "Content-Type": "text/html; charset=utf-8" } }
+  );
+}
 
 self.addEventListener("install", (event) => {
   event.waitUntil(
-    caches.open(CACHE_NAME).then((cache) => cache.addAll(CORE_ASSETS))
+    caches.open(CACHE_NAME).then((cache) => Promise.all([
+      cache.addAll(STATIC_ASSETS),
+      // Fetched signed out, so the fallback never shows someone's dashboard.
+      fetch(OFFLINE_PAGE, { credentials: "omit" }).then((response) => cache.put(OFFLINE_PAGE, response))
+    ]))
   );
   self.skipWaiting();
 });
@@ -22,14 +146,49 @@ self.addEventListener("activate", (event) => {
   self.clients.claim();
 });
 
+self.addEventListener("sync", (event) => {
+  if (event.tag === SYNC_TAG) {
+    event.waitUntil(flushQueue());
+  }
+});
+
+self.addEventListener("message", (event) => {
+  if (event.data && event.data.type === "flush-clock-events") {
+    event.waitUntil(flushQueue(event.data.userId ? String(event.data.userId) : null).catch(() => {}));
+  }
+});
+
 self.addEventListener("fetch", (event) => {
-  if (event.request.method !== "GET") {
+  const url = new URL(event.request.url);
+  const clock = event.request.method === "POST" && url.origin === self.location.origin && url.pathname.match(CLOCK_PATH);
+
+  if (clock) {
+    const owner = requestUserId(event.request);
+    event.respondWith(
+      fetch(event.request.clone()).then((response) => {
+        event.waitUntil(owner.then((userId) => userId && flushQueue(userId)).catch(() => {}));
+        return response;
+      }).catch(() => owner.then((userId) =>
+        userId ? queueClockEvent(clock[1], userId).then((item) => offlineResponse(url, item))
+               : offlineResponse(url, null)
+      ))
+    );
     return;
   }
 
-  event.respondWith(
-    caches.match(event.request).then((cached) =>
-      cached || fetch(event.request).catch(() => caches.match("/login"))
-    )
-  );
+  if (event.request.method !== "GET" || url.origin !== self.location.origin) {
+    return;
+  }
+
+  if (url.pathname.startsWith("/static/")) {
+    event.respondWith(
+      caches.match(event.request).then((cached) => cached || fetch(event.request))
+    );
+  } else if (event.request.mode === "navigate") {
+    // Network first, so logouts, deactivations and flash messages are never
+    // replaced by a copy cached at install time.
+    event.respondWith(
+      fetch(event.request).catch(() => caches.match(OFFLINE_PAGE))
+    );
+  }
 });
@@ -0,0 +1,48 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# The app reads its configuration at import time, so point it at a
+# throwaway database before anything imports it.
+_TMP = tempfile.mkdtemp(prefix="timetracker-tests-")
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(_TMP, "test.db")
+os.environ["ACTIVITY_LOG_ARCHIVE_DIR"] = os.path.join(_TMP, "archive")
+os.environ.setdefault("SECRET_KEY", "test-secret")
+
+import app as timetracker  # noqa: E402
+
+timetracker.app.config.update(TESTING=True, MAIL_ENABLED=False)
+
+
+@pytest.fixture
+def app():
+    """The app on a freshly migrated and seeded database."""
+    flask_app = timetracker.app
+    with flask_app.app_context():
+        timetracker.db.session.remove()
+        timetracker.db.drop_all()
+        timetracker.run_migrations()
+        timetracker.seed_demo_data()
+        timetracker.settings_cache.invalidate()
+        timetracker.user_cache.clear()
+        timetracker.user_directory.invalidate()
+        timetracker.report_cache.clear()
+        flask_app.config["SCHEMA_READY"] = True
+        timetracker.db.session.remove()
+    yield flask_app
+
+
+@pytest.fixture
+def login(app):
+    """login(name, password) -> a test client signed in as that user."""
+    def _login(name="Abhi", password="abhi123"):
+        client = app.test_client()
+        response = client.post("/login", data={"name": name, "password": password})
+        assert response.status_code == 302
+        return client
+    return _login
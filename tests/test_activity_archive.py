@@ -0,0 +1,75 @@
+"""Archived activity rows read back through the per-month index."""
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from app import _append_archive, archive_path, iter_archived_logs
+
+NO_FILTERS = {"user_id": None, "action": None, "start": None, "end": None}
+
+
+@pytest.fixture(autouse=True)
+def archive_dir(app, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, "ACTIVITY_LOG_ARCHIVE_DIR", str(tmp_path))
+
+
+def rows(first_id, count, start=datetime(2025, 1, 5, 9, 0)):
+    return [
+        SimpleNamespace(id=first_id + i, user_id=i % 3 + 1, action="CLOCK_IN" if i % 2 else "LOGIN",
+                        details=f"row {first_id + i}", timestamp=start + timedelta(minutes=i))
+        for i in range(count)
+    ]
+
+
+def keys(logs):
+    return [(log.timestamp, log.id) for log in logs]
+
+
+def test_pages_newest_first_and_forward(app):
+    with app.app_context():
+        _append_archive("2025-01", rows(1, 50))
+        _append_archive("2025-02", rows(51, 50, start=datetime(2025, 2, 1)))
+        logs = list(iter_archived_logs(NO_FILTERS))
+        assert [log.id for log in logs] == list(range(100, 0, -1))
+        assert all(log.archived for log in logs)
+
+        cursor = (logs[60].timestamp, logs[60].id)
+        older = list(iter_archived_logs(NO_FILTERS, before=cursor))
+        assert keys(older) == keys(logs[61:])
+        newer = list(iter_archived_logs(NO_FILTERS, after=cursor))
+        assert keys(newer) == keys(reversed(logs[:60]))
+
+
+def test_filters_and_duplicates(app):
+    with app.app_context():
+        batch = rows(1, 40)
+        _append_archive("2025-01", batch)
+        # A run that failed before its delete archives the same rows again.
+        _append_archive("2025-01", batch[:10])
+        assert len(list(iter_archived_logs(NO_FILTERS))) == 40
+
+        filters = dict(NO_FILTERS, user_id=2, action="CLOCK_IN",
+                       start=datetime(2025, 1, 5, 9, 10), end=datetime(2025, 1, 5, 9, 30))
+        expected = [row.id for row in reversed(batch) if row.user_id == 2 and row.action == "CLOCK_IN"
+                    and filters["start"] <= row.timestamp < filters["end"]]
+        assert [log.id for log in iter_archived_logs(filters)] == expected
+
+
+def test_index_follows_appends(app):
+    with app.app_context():
+        _append_archive("2025-01", rows(1, 5))
+        assert len(list(iter_archived_logs(NO_FILTERS))) == 5
+        _append_archive("2025-01", rows(6, 5, start=datetime(2025, 1, 6)))
+        assert [log.id for log in iter_archived_logs(NO_FILTERS)][:2] == [10, 9]
+
+
+def test_truncated_member_keeps_complete_rows(app):
+    with app.app_context():
+        _append_archive("2025-01", rows(1, 20))
+        path = archive_path("2025-01")
+        _append_archive("2025-01", rows(21, 20, start=datetime(2025, 1, 6)))
+        with open(path, "r+b") as f:
+            f.truncate(f.seek(0, 2) - 20)
+        logs = list(iter_archived_logs(NO_FILTERS))
+        assert {log.id for log in logs} >= set(range(1, 21))
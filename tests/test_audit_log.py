@@ -0,0 +1,113 @@
+"""Audit log paging across the hot table and the archive, filters and export."""
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import ActivityLog, ArchivedLog, User, archive_activity_log, audit_filters, audit_page, db
+
+PAGE = 7
+
+
+@pytest.fixture
+def logs(app, tmp_path, monkeypatch):
+    """90 rows over the last 100 days, the older ~60% moved to the archive.
+
+    Returns every row (hot and archived) as (timestamp, id, user_id, action)
+    in page order, captured before archiving.
+    """
+    monkeypatch.setitem(app.config, "ACTIVITY_LOG_ARCHIVE_DIR", str(tmp_path))
+    with app.app_context():
+        users = [uid for (uid,) in db.session.query(User.id).filter(User.name.in_(["Aman", "Sneha"]))]
+        start = datetime.now().replace(microsecond=0) - timedelta(days=100)
+        for i in range(90):
+            # Pairs share a timestamp, so the id breaks ties.
+            db.session.add(ActivityLog(
+                user_id=users[i % 2], action="CLOCK_IN" if i % 3 else "LOGIN",
+                details=f"row {i}", timestamp=start + timedelta(days=i // 2 * 2.2)
+            ))
+        db.session.commit()
+        rows = sorted(
+            ((log.timestamp, log.id, log.user_id, log.action) for log in ActivityLog.query),
+            reverse=True
+        )
+        assert archive_activity_log(days=40) > 40
+        assert ActivityLog.query.count() > 20
+    return rows
+
+
+def expected(rows, user_id=None, action=None, start=None, end=None):
+    return [
+        (ts, log_id) for ts, log_id, uid, act in rows
+        if (user_id is None or uid == user_id) and (action is None or act == action)
+        and (start is None or ts >= start) and (end is None or ts < end)
+    ]
+
+
+def walk(filters):
+    """Every page, oldest-ward, as the Older link follows them."""
+    pages, before = [], None
+    while True:
+        page = audit_page(filters, PAGE + 1, before=before)
+        pages.append(page[:PAGE])
+        if len(page) <= PAGE:
+            return pages
+        before = (page[PAGE - 1].timestamp, page[PAGE - 1].id)
+
+
+def keys(logs):
+    return [(log.timestamp, log.id) for log in logs]
+
+
+def test_pages_cross_the_hot_archive_split(app, logs):
+    with app.app_context():
+        pages = walk(audit_filters({}))
+        assert [key for page in pages for key in keys(page)] == expected(logs)
+        mixed = [page for page in pages if len({isinstance(log, ArchivedLog) for log in page}) == 2]
+        assert mixed, "no page straddles the split"
+
+        # Newer from the top of each page returns the page before it.
+        for older, newer in zip(pages[1:], pages):
+            back = audit_page(audit_filters({}), PAGE, after=keys(older)[0])
+            assert keys(back) == list(reversed(keys(newer)))[:PAGE]
+
+
+@pytest.mark.parametrize("args", [
+    {"user": "AMAN"},
+    {"action": "login"},
+    {"from": "FROM", "to": "TO"},
+    {"user": "AMAN", "action": "CLOCK_IN", "from": "FROM"},
+])
+def test_filters(app, logs, args):
+    with app.app_context():
+        aman = db.session.query(User.id).filter_by(name="Aman").scalar()
+        cut = datetime.now() - timedelta(days=40)
+        values = {"AMAN": str(aman), "FROM": (cut - timedelta(days=30)).date().isoformat(),
+                  "TO": (cut + timedelta(days=10)).date().isoformat()}
+        args = {key: values.get(value, value) for key, value in args.items()}
+        filters = audit_filters(args)
+        got = [key for page in walk(filters) for key in keys(page)]
+    want = expected(logs, filters["user_id"], filters["action"], filters["start"], filters["end"])
+    assert got == want
+    assert want
+
+
+@pytest.mark.parametrize("export_format", ["csv", "ndjson"])
+def test_export_matches_pages(app, logs, login, export_format):
+    client = login()
+    with app.app_context():
+        aman = db.session.query(User.id).filter_by(name="Aman").scalar()
+        total = sum(len(page) for page in walk(audit_filters({"user": str(aman)})))
+    response = client.get(f"/audit-log/export?format={export_format}&user={aman}")
+    body = response.get_data(as_text=True)
+    if export_format == "csv":
+        records = list(csv.DictReader(io.StringIO(body)))
+    else:
+        records = [json.loads(line) for line in body.splitlines() if line]
+    assert len(records) == total == len(expected(logs, aman))
+    assert {str(record["user_id"]) for record in records} == {str(aman)}
+    # Newest first across the split, like the pages.
+    stamps = [record["timestamp"] for record in records]
+    assert stamps == sorted(stamps, reverse=True)
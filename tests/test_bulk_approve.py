@@ -0,0 +1,88 @@
+"""Bulk timesheet approval: one audit record, locked weeks skipped, lock upsert."""
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from app import ActivityLog, TimeEntry, User, WeekApproval, db, get_week_range
+
+WEEK_START, WEEK_END = get_week_range(date.today() - timedelta(days=7))
+
+
+@pytest.fixture
+def week(app):
+    """Completed entries last week for Aman, Udita and Sneha.
+
+    Sneha's week is already locked; Udita has an unlocked approval row.
+    Returns {name: user_id}.
+    """
+    with app.app_context():
+        staff = dict(db.session.query(User.name, User.id).filter(User.name.in_(["Aman", "Udita", "Sneha"])))
+        for user_id in staff.values():
+            for offset in range(3):
+                day = WEEK_START + timedelta(days=offset)
+                clock_in = datetime.combine(day, datetime.min.time()).replace(hour=9)
+                db.session.add(TimeEntry(user_id=user_id, day=day, clock_in=clock_in,
+                                         clock_out=clock_in + timedelta(hours=8), status="pending"))
+        db.session.add(WeekApproval(user_id=staff["Sneha"], week_start=WEEK_START, week_end=WEEK_END, locked=True))
+        db.session.add(WeekApproval(user_id=staff["Udita"], week_start=WEEK_START, week_end=WEEK_END,
+                                    locked=False, status="pending"))
+        db.session.commit()
+    return staff
+
+
+def approve(client, **body):
+    return client.post("/api/timesheets/approve", json=body)
+
+
+def test_week_approval_skips_locked_weeks_and_upserts_locks(app, login, week):
+    client = login()
+    response = approve(client, week=WEEK_START.isoformat(), lock_week=True, notes="ok")
+    assert response.status_code == 200
+    assert response.json == {"approved": 6, "skipped_locked": 3, "weeks_locked": 2}
+
+    with app.app_context():
+        statuses = dict(db.session.query(TimeEntry.user_id, TimeEntry.status).distinct())
+        assert statuses[week["Aman"]] == statuses[week["Udita"]] == "approved"
+        assert statuses[week["Sneha"]] == "pending"
+
+        approvals = WeekApproval.query.filter_by(week_start=WEEK_START).all()
+        # Udita's existing row is updated, Aman gets a new one, Sneha's is untouched.
+        assert sorted(a.user_id for a in approvals) == sorted(week.values())
+        assert all(a.locked for a in approvals)
+        udita = next(a for a in approvals if a.user_id == week["Udita"])
+        assert udita.status == "approved" and udita.approved_by is not None
+
+        audit = ActivityLog.query.filter_by(action="TIMESHEETS_BULK_APPROVED").all()
+        assert len(audit) == 1
+        assert "6 entries for 2 staff" in audit[0].details
+        assert "3 skipped in locked weeks" in audit[0].details
+
+
+def test_department_and_entry_filters(app, login, week):
+    client = login()
+    with app.app_context():
+        aman_entry = TimeEntry.query.filter_by(user_id=week["Aman"]).first().id
+        department = db.session.get(User, week["Udita"]).department
+
+    assert approve(client, entry_ids=[aman_entry]).json["approved"] == 1
+    # Aman and Udita are both in Service; the approved entry isn't counted twice.
+    assert approve(client, week=WEEK_START.isoformat(), department=department).json["approved"] == 5
+    with app.app_context():
+        assert ActivityLog.query.filter_by(action="TIMESHEETS_BULK_APPROVED").count() == 2
+
+
+@pytest.mark.parametrize("body, error", [
+    ({"week": "x"}, "week must be a date (YYYY-MM-DD)"),
+    ({"week": 20260301}, "week must be a date (YYYY-MM-DD)"),
+    ({"entry_ids": ["x"]}, "entry_ids must be a list of entry ids"),
+    ({"entry_ids": 5}, "entry_ids must be a list of entry ids"),
+    ({"week": "2026-03-02", "department": ["Floor"]}, "department and notes must be strings"),
+    ({"department": "Service"}, "Choose a week or entries to approve"),
+    ({}, "Choose a week or entries to approve"),
+])
+def test_invalid_requests_get_fixed_messages(app, login, week, body, error):
+    response = approve(login(), **body)
+    assert response.status_code == 400
+    assert response.json == {"error": error}
+    with app.app_context():
+        assert TimeEntry.query.filter_by(status="approved").count() == 0
@@ -0,0 +1,127 @@
+"""Idempotency-Key handling on /api/v1/clock/<event>."""
+import json
+import threading
+from datetime import date, datetime, timedelta
+
+import app as timetracker
+from app import (
+    ActivityLog, DailyTotals, IdempotencyKey, TimeEntry, User, WeekApproval, db, get_week_range
+)
+
+
+def aman_id():
+    return db.session.query(User.id).filter_by(name="Aman").scalar()
+
+
+def punch(client, event, key=None):
+    headers = {"Idempotency-Key": key} if key else {}
+    return client.post(f"/api/v1/clock/{event}", headers=headers)
+
+
+def clock_ins(user_id):
+    return ActivityLog.query.filter_by(user_id=user_id, action="CLOCK_IN").count()
+
+
+def test_same_key_replays_the_stored_response(app, login):
+    client = login("Aman", "aman123")
+    first = punch(client, "clock_in", key="k1")
+    again = punch(client, "clock_in", key="k1")
+    assert first.status_code == again.status_code == 200
+    assert again.get_data() == first.get_data()
+    # A new key is a new request: this one is out of order.
+    assert punch(client, "clock_in", key="k2").status_code == 409
+    with app.app_context():
+        assert clock_ins(aman_id()) == 1
+
+
+def test_concurrent_requests_with_one_key_record_one_punch(app, login):
+    session_cookie = login("Aman", "aman123").get_cookie("session").value
+    clients = []
+    for _ in range(8):
+        client = app.test_client()
+        client.set_cookie("session", session_cookie)
+        clients.append(client)
+    barrier = threading.Barrier(len(clients))
+    responses = []
+
+    def send(client):
+        barrier.wait()
+        response = punch(client, "clock_in", key="same")
+        responses.append((response.status_code, response.get_data()))
+
+    threads = [threading.Thread(target=send, args=(client,)) for client in clients]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(responses) == len(clients)
+    assert len(set(responses)) == 1
+    assert responses[0][0] == 200
+    with app.app_context():
+        assert clock_ins(aman_id()) == 1
+        assert IdempotencyKey.query.filter_by(key="same").count() == 1
+
+
+def test_rejected_punch_stores_only_the_error(app, login):
+    client = login("Aman", "aman123")
+    first = punch(client, "clock_out", key="early")
+    assert first.status_code == 409
+    with app.app_context():
+        # No blank entry or totals are left behind.
+        assert TimeEntry.query.filter_by(user_id=aman_id(), day=date.today()).count() == 0
+        assert db.session.get(DailyTotals, (aman_id(), date.today())) is None
+    again = punch(client, "clock_out", key="early")
+    assert (again.status_code, again.get_data()) == (409, first.get_data())
+
+
+def test_locked_week_replays_423_after_unlock(app, login):
+    client = login("Aman", "aman123")
+    w_start, w_end = get_week_range(date.today())
+    with app.app_context():
+        db.session.add(WeekApproval(user_id=aman_id(), week_start=w_start, week_end=w_end, locked=True))
+        db.session.commit()
+    first = punch(client, "clock_in", key="locked")
+    assert first.status_code == 423
+    with app.app_context():
+        WeekApproval.query.delete()
+        db.session.commit()
+        assert TimeEntry.query.filter_by(user_id=aman_id()).count() == 0
+    again = punch(client, "clock_in", key="locked")
+    assert (again.status_code, again.get_data()) == (423, first.get_data())
+    assert punch(client, "clock_in", key="unlocked").status_code == 200
+
+
+def test_losing_a_key_race_returns_the_winners_response(app, login, monkeypatch):
+    client = login("Aman", "aman123")
+    with app.app_context():
+        # The winner committed between our lookup and our commit.
+        db.session.add(IdempotencyKey(user_id=aman_id(), key="race", status_code=200,
+                                      response=json.dumps({"winner": True})))
+        db.session.commit()
+    lookups = []
+    real_lookup = timetracker.stored_idempotent_response
+
+    def late_lookup(key):
+        lookups.append(key)
+        return None if len(lookups) == 1 else real_lookup(key)
+
+    monkeypatch.setattr(timetracker, "stored_idempotent_response", late_lookup)
+    response = punch(client, "clock_in", key="race")
+    assert (response.status_code, response.json) == (200, {"winner": True})
+    assert len(lookups) == 2
+    with app.app_context():
+        # The loser's punch was rolled back.
+        assert clock_ins(aman_id()) == 0
+
+
+def test_prune_command_deletes_only_expired_keys(app, login):
+    client = login("Aman", "aman123")
+    punch(client, "clock_in", key="fresh")
+    with app.app_context():
+        db.session.add(IdempotencyKey(user_id=aman_id(), key="old", status_code=200, response="{}",
+                                      created_at=datetime.now() - timedelta(hours=25)))
+        db.session.commit()
+        result = app.test_cli_runner().invoke(args=["prune-idempotency-keys"])
+        assert "Pruned 1 expired" in result.output
+        assert [row.key for row in IdempotencyKey.query] == ["fresh"]
@@ -0,0 +1,63 @@
+"""Offline punches replay only under the user who made them."""
+from datetime import datetime, timedelta, timezone
+
+from app import ActivityLog, TimeEntry, User, db
+
+
+def user_id(name):
+    return db.session.query(User.id).filter_by(name=name).scalar()
+
+
+def utc(hours_ago):
+    # What the service worker sends: new Date().toISOString().
+    at = datetime.now(timezone.utc) - timedelta(hours=hours_ago)
+    return at.isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+def test_batch_applies_only_the_signed_in_users_events(app, login):
+    client = login("Aman", "aman123")
+    with app.app_context():
+        aman, sneha = user_id("Aman"), user_id("Sneha")
+
+    response = client.post("/api/v1/clock/batch", json={"events": [
+        {"id": "mine", "user_id": aman, "event": "clock_in", "at": utc(2)},
+        {"id": "theirs", "user_id": sneha, "event": "clock_in", "at": utc(3)},
+        {"id": "nobody", "event": "clock_in", "at": utc(3)},
+    ]})
+    assert response.status_code == 200
+    results = {result["id"]: result for result in response.json["results"]}
+    assert results["mine"]["status"] == "applied"
+    assert results["theirs"]["status"] == "other_user"
+    assert results["nobody"]["status"] == "rejected"
+
+    with app.app_context():
+        assert TimeEntry.query.filter_by(user_id=aman).count() == 1
+        assert TimeEntry.query.filter_by(user_id=sneha).count() == 0
+        assert ActivityLog.query.filter_by(user_id=sneha, action="CLOCK_IN").count() == 0
+
+
+def test_batch_times_with_offset_become_server_local(app, login):
+    client = login("Aman", "aman123")
+    with app.app_context():
+        aman = user_id("Aman")
+    at = datetime.now(timezone.utc) - timedelta(hours=1)
+    response = client.post("/api/v1/clock/batch", json={"events": [
+        {"id": "e1", "user_id": aman, "event": "clock_in", "at": at.isoformat().replace("+00:00", "Z")},
+    ]})
+    assert response.json["results"][0]["status"] == "applied"
+    with app.app_context():
+        entry = TimeEntry.query.filter_by(user_id=aman).one()
+        assert entry.clock_in == at.astimezone().replace(tzinfo=None)
+
+
+def test_dashboard_form_for_another_user_is_refused(app, login):
+    client = login("Aman", "aman123")
+    with app.app_context():
+        aman, sneha = user_id("Aman"), user_id("Sneha")
+    response = client.post("/action/clock_in", data={"user_id": str(sneha)})
+    assert response.status_code == 302
+    with app.app_context():
+        assert TimeEntry.query.filter(TimeEntry.user_id == aman, TimeEntry.clock_in.isnot(None)).count() == 0
+    client.post("/action/clock_in", data={"user_id": str(aman)})
+    with app.app_context():
+        assert TimeEntry.query.filter(TimeEntry.user_id == aman, TimeEntry.clock_in.isnot(None)).count() == 1
@@ -0,0 +1,44 @@
+"""Simultaneous clock-ins for one user must record a single punch."""
+import threading
+from datetime import date
+
+import pytest
+
+from app import ActivityLog, TimeEntry, User, db
+
+THREADS = 24
+
+
+@pytest.mark.parametrize("path", ["/action/clock_in", "/api/v1/clock/clock_in"])
+def test_concurrent_clock_in_records_one_entry(app, login, path):
+    session_cookie = login("Aman", "aman123").get_cookie("session").value
+    clients = []
+    for _ in range(THREADS):
+        client = app.test_client()
+        client.set_cookie("session", session_cookie)
+        clients.append(client)
+
+    barrier = threading.Barrier(THREADS)
+    statuses, errors = [], []
+
+    def clock_in(client):
+        barrier.wait()
+        try:
+            statuses.append(client.post(path).status_code)
+        except Exception as e:  # surfaced below, a thread can't fail the test
+            errors.append(e)
+
+    threads = [threading.Thread(target=clock_in, args=(client,)) for client in clients]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert len(statuses) == THREADS
+    assert 500 not in statuses
+    with app.app_context():
+        user_id = db.session.query(User.id).filter_by(name="Aman").scalar()
+        assert TimeEntry.query.filter_by(user_id=user_id, day=date.today()).count() == 1
+        assert ActivityLog.query.filter_by(user_id=user_id, action="CLOCK_IN").count() == 1
+        assert TimeEntry.query.filter_by(user_id=user_id, day=date.today()).one().clock_in is not None
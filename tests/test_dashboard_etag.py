@@ -0,0 +1,37 @@
+"""The dashboard's ETag must change with anything the page draws."""
+from app import User, db, user_changed
+
+
+def test_promotion_to_admin_changes_the_etag(app, login):
+    client = login("Aman", "aman123")
+    first = client.get("/dashboard")
+    assert first.status_code == 200
+    assert b'href="/admin"' not in first.data
+    etag = first.headers["ETag"]
+    assert client.get("/dashboard", headers={"If-None-Match": etag}).status_code == 304
+
+    with app.app_context():
+        user = User.query.filter_by(name="Aman").one()
+        user.is_admin = True
+        user_changed(user.id)
+        db.session.commit()
+
+    response = client.get("/dashboard", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert b'href="/admin"' in response.data
+
+
+def test_calendar_revalidates_while_a_flash_is_pending(app, login):
+    client = login("Aman", "aman123")
+    client.post("/action/clock_in")
+    with client.session_transaction() as session:
+        assert session.get("_flashes")
+
+    first = client.get("/api/calendar")
+    etag = first.headers["ETag"]
+    assert client.get("/api/calendar", headers={"If-None-Match": etag}).status_code == 304
+
+    # The flash is still waiting for the next HTML page, which isn't tagged.
+    dashboard = client.get("/dashboard")
+    assert "Clock In recorded" in dashboard.get_data(as_text=True)
+    assert "ETag" not in dashboard.headers
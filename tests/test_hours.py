@@ -0,0 +1,88 @@
+"""entry_minutes() must agree with the scalar minutes()/work_and_break_minutes()."""
+import random
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+import hours
+from hours import TIME_FIELDS, entry_minutes, minutes, work_and_break_minutes
+
+ROWS = 20000
+OVERTIME_AFTER = 8 * 60
+
+
+def random_rows(seed, count=ROWS):
+    """Random entries: NULLs, same-second spans, and ends that wrap past midnight."""
+    rng = random.Random(seed)
+    base = datetime(2026, 3, 1)
+    rows = []
+    for _ in range(count):
+        day = base + timedelta(days=rng.randrange(60))
+        row = []
+        for _field in TIME_FIELDS:
+            if rng.random() < 0.15:
+                row.append(None)
+            else:
+                row.append(day + timedelta(seconds=rng.randrange(36 * 3600), microseconds=rng.choice([0, 500000])))
+        rows.append(tuple(row))
+    # Edge cases: everything empty, zero-length spans, and an overnight shift.
+    night = datetime(2026, 3, 1, 22, 0)
+    rows.append((None,) * len(TIME_FIELDS))
+    rows.append((night, night, night, night, None, None))
+    rows.append((night, night.replace(hour=6), night.replace(hour=23), night.replace(hour=0), None, None))
+    return rows
+
+
+def scalar_minutes(rows):
+    work, breaks, overtime = [], [], []
+    for row in rows:
+        work_mins, break_mins = work_and_break_minutes(SimpleNamespace(**dict(zip(TIME_FIELDS, row))))
+        work.append(work_mins)
+        breaks.append(break_mins)
+        overtime.append(max(0, work_mins - OVERTIME_AFTER))
+    return work, breaks, overtime
+
+
+def as_sqlite_strings(rows):
+    # SQLite hands DateTime columns back as "YYYY-MM-DD HH:MM:SS.ffffff".
+    return [tuple(value.strftime("%Y-%m-%d %H:%M:%S.%f") if value else None for value in row) for row in rows]
+
+
+def test_scalar_minutes_wraps_past_midnight():
+    assert minutes(datetime(2026, 3, 1, 22), datetime(2026, 3, 1, 6)) == 8 * 60
+    assert minutes(None, datetime(2026, 3, 1, 6)) == 0
+
+
+@pytest.mark.skipif(not hours.HAVE_NUMPY, reason="NumPy not installed")
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_numpy_matches_scalar_for_datetimes(seed):
+    rows = random_rows(seed)
+    assert entry_minutes(rows, overtime_after=OVERTIME_AFTER) == scalar_minutes(rows)
+
+
+@pytest.mark.skipif(not hours.HAVE_NUMPY, reason="NumPy not installed")
+@pytest.mark.parametrize("seed", [4, 5])
+def test_numpy_matches_scalar_for_sqlite_strings(seed):
+    rows = random_rows(seed)
+    assert entry_minutes(as_sqlite_strings(rows), overtime_after=OVERTIME_AFTER) == scalar_minutes(rows)
+
+
+@pytest.mark.parametrize("seed", [6, 7])
+def test_fallback_without_numpy_matches_scalar(monkeypatch, seed):
+    monkeypatch.setattr(hours, "np", None)
+    rows = random_rows(seed)
+    assert entry_minutes(rows, overtime_after=OVERTIME_AFTER) == scalar_minutes(rows)
+
+
+@pytest.mark.parametrize("numpy", [True, False])
+def test_empty_batch_and_no_overtime_threshold(monkeypatch, numpy):
+    if not numpy:
+        monkeypatch.setattr(hours, "np", None)
+    elif not hours.HAVE_NUMPY:
+        pytest.skip("NumPy not installed")
+    assert entry_minutes([]) == ([], [], [])
+    rows = random_rows(8, count=200)
+    work, breaks, overtime = entry_minutes(rows)
+    assert (work, breaks) == scalar_minutes(rows)[:2]
+    assert overtime == [0] * len(rows)
@@ -0,0 +1,134 @@
+"""The mail workers against a local SMTP sink: delivery, retry and failure."""
+import socketserver
+import threading
+
+import pytest
+
+from app import MailQueue, OutboundEmail, db, send_email_async
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib: refuses the addresses in server.refuse."""
+
+    def reply(self, line):
+        self.wfile.write((line + "\r\n").encode())
+
+    def handle(self):
+        self.reply("220 sink")
+        recipients = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip()
+            verb = command.split(" ", 1)[0].upper()
+            if verb in ("EHLO", "HELO"):
+                self.reply("250 sink")
+            elif verb == "MAIL":
+                recipients = []
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                address = command.split(":", 1)[1].strip().strip("<>")
+                if address in self.server.refuse:
+                    self.reply("550 No such user")
+                else:
+                    recipients.append(address)
+                    self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                data = []
+                for data_line in iter(self.rfile.readline, b""):
+                    if data_line.rstrip(b"\r\n") == b".":
+                        break
+                    data.append(data_line.decode())
+                self.server.messages.append((recipients, "".join(data)))
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("250 OK")
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), SMTPHandler)
+        self.messages = []
+        self.refuse = set()
+
+
+@pytest.fixture
+def sink(app, monkeypatch):
+    server = SMTPSink()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    for key, value in {
+        "MAIL_SERVER": "127.0.0.1", "MAIL_PORT": server.server_address[1], "MAIL_USE_TLS": False,
+        "MAIL_USE_SSL": False, "MAIL_USERNAME": None, "MAIL_FROM": "timetracker@example.com",
+        "MAIL_RETRY_SECONDS": 0, "MAIL_MAX_ATTEMPTS": 2,
+    }.items():
+        monkeypatch.setitem(app.config, key, value)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def drain(queue):
+    """Run the worker loop body in this thread until nothing is due."""
+    server = None
+    while True:
+        batch = queue._claim()
+        if not batch:
+            return queue._close(server)
+        server = queue._send_batch(server, batch)
+
+
+def queue_mail(to_email, subject="Daily Work Summary"):
+    send_email_async(to_email, subject, "Worked: 8.00h")
+    db.session.commit()
+
+
+def test_delivers_queued_mail(app, sink):
+    queue = MailQueue()
+    with app.app_context():
+        queue_mail("aman@company.com")
+        queue_mail("udita@company.com", subject="Leave approved")
+        drain(queue)
+        emails = OutboundEmail.query.order_by(OutboundEmail.id).all()
+        assert [(e.status, e.attempts) for e in emails] == [("sent", 1), ("sent", 1)]
+        assert all(e.sent_at for e in emails)
+    assert [to for to, _ in sink.messages] == [["aman@company.com"], ["udita@company.com"]]
+    assert "Subject: Leave approved" in sink.messages[1][1]
+    assert queue.sent == 2
+
+
+def test_refused_mail_is_retried_then_failed(app, sink):
+    queue = MailQueue()
+    sink.refuse.add("nobody@company.com")
+    with app.app_context():
+        queue_mail("nobody@company.com")
+        queue_mail("aman@company.com")
+
+        queue._send_batch(None, queue._claim())
+        bounced = OutboundEmail.query.filter_by(to_email="nobody@company.com").one()
+        assert (bounced.status, bounced.attempts) == ("pending", 1)
+        assert "No such user" in bounced.last_error
+        assert OutboundEmail.query.filter_by(to_email="aman@company.com").one().status == "sent"
+
+        # MAIL_MAX_ATTEMPTS is 2: the second refusal is final.
+        drain(queue)
+        db.session.expire_all()
+        bounced = db.session.get(OutboundEmail, bounced.id)
+        assert (bounced.status, bounced.attempts) == ("failed", 2)
+    assert (queue.sent, queue.retried, queue.failed) == (1, 1, 1)
+    assert [to for to, _ in sink.messages] == [["aman@company.com"]]
+
+
+def test_disabled_mail_starts_no_workers(app, monkeypatch):
+    monkeypatch.setitem(app.config, "MAIL_ENABLED", False)
+    queue = MailQueue()
+    queue.wake()
+    queue.ensure_started()
+    assert queue._threads == []
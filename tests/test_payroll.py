@@ -0,0 +1,11 @@
+"""Payroll export range limits."""
+
+
+def test_payroll_export_is_capped_at_a_year(app, login):
+    client = login()
+    ok = client.get("/export-payroll?from=2025-01-01&to=2025-12-31")
+    assert ok.status_code == 200
+    assert ok.mimetype == "text/csv"
+    ok.close()
+    assert client.get("/export-payroll?from=2024-12-01&to=2026-01-01").status_code == 400
+    assert client.get("/export-payroll?from=2010-01-01&to=2026-01-01").status_code == 400
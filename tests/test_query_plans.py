@@ -0,0 +1,61 @@
+"""The hot lookups must be answered from an index, not a table scan."""
+from datetime import date, timedelta
+
+import pytest
+
+from app import Roster, TimeEntry, WeekApproval, db, get_week_range
+
+TODAY = date(2026, 3, 4)
+WEEK_START, WEEK_END = get_week_range(TODAY)
+
+
+def query_plan(query):
+    sql = str(query.statement.compile(dialect=db.engine.dialect, compile_kwargs={"literal_binds": True}))
+    with db.engine.connect() as conn:
+        return " | ".join(row[-1] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + sql))
+
+
+HOT_QUERIES = {
+    "today's entry (user_id, day)": (
+        lambda: TimeEntry.query.filter_by(user_id=1, day=TODAY),
+        "SEARCH time_entry USING INDEX ux_time_entry_user_day (user_id=? AND day=?)",
+    ),
+    "one user's week": (
+        lambda: TimeEntry.query.filter(
+            TimeEntry.user_id == 1, TimeEntry.day >= WEEK_START, TimeEntry.day <= WEEK_END
+        ),
+        "SEARCH time_entry USING INDEX ux_time_entry_user_day (user_id=? AND day>? AND day<?)",
+    ),
+    "everyone's day range": (
+        lambda: TimeEntry.query.filter(TimeEntry.day >= WEEK_START, TimeEntry.day <= WEEK_END),
+        "SEARCH time_entry USING INDEX ix_time_entry_day (day>? AND day<?)",
+    ),
+    "roster cell": (
+        lambda: Roster.query.filter_by(user_id=1, day_of_week="Monday", week_start=WEEK_START),
+        "SEARCH roster USING INDEX ix_roster_user_day_week (user_id=? AND day_of_week=? AND week_start=?)",
+    ),
+    "roster week": (
+        lambda: Roster.query.filter_by(week_start=WEEK_START),
+        "SEARCH roster USING INDEX ix_roster_week (week_start=?)",
+    ),
+    "week lock": (
+        lambda: WeekApproval.query.filter_by(
+            user_id=1, week_start=WEEK_START, week_end=WEEK_END, locked=True
+        ),
+        "SEARCH week_approval USING INDEX ix_week_approval_user_week "
+        "(user_id=? AND week_start=? AND week_end=? AND locked=?)",
+    ),
+}
+
+
+@pytest.mark.parametrize("name", HOT_QUERIES)
+def test_hot_query_uses_index(app, name):
+    build, expected = HOT_QUERIES[name]
+    with app.app_context():
+        # A few rows so the planner has real tables to look at.
+        for offset in range(14):
+            db.session.add(TimeEntry(user_id=1, day=TODAY - timedelta(days=offset)))
+        db.session.commit()
+        plan = query_plan(build())
+    assert expected in plan
+    assert "SCAN" not in plan
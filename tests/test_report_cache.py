@@ -0,0 +1,79 @@
+"""The report cache: dropped by changes a report shows, kept otherwise."""
+import re
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from app import TimeEntry, User, db, get_week_range, refresh_totals
+
+WEEK_START, WEEK_END = get_week_range(date.today() - timedelta(days=7))
+REPORT = f"/reports?type=weekly&date={WEEK_START.isoformat()}"
+
+
+@pytest.fixture
+def admin(app, login, monkeypatch):
+    # Only invalidation may make a cached report stale, never the re-check timer.
+    monkeypatch.setitem(app.config, "CACHE_CHECK_SECONDS", 3600)
+    return login()
+
+
+def counters(client):
+    """(hits, misses) as /admin/stats shows them."""
+    page = client.get("/admin/stats").get_data(as_text=True)
+    return tuple(int(re.search(rf"<td>{label}</td><td>(\d+)</td>", page).group(1))
+                 for label in ("Hits", "Misses"))
+
+
+def viewed(client):
+    """Open the report; return how the hit/miss counters moved."""
+    before = counters(client)
+    assert client.get(REPORT).status_code == 200
+    after = counters(client)
+    return after[0] - before[0], after[1] - before[1]
+
+
+def work_on(day):
+    user_id = db.session.query(User.id).filter_by(name="Aman").scalar()
+    clock_in = datetime.combine(day, datetime.min.time()).replace(hour=9)
+    db.session.add(TimeEntry(user_id=user_id, day=day, clock_in=clock_in,
+                             clock_out=clock_in + timedelta(hours=8)))
+    refresh_totals(user_id, [day])
+    db.session.commit()
+
+
+def test_entries_in_range_invalidate_the_report(app, admin):
+    assert viewed(admin) == (0, 1)
+    assert viewed(admin) == (1, 0)
+
+    with app.app_context():
+        work_on(WEEK_START - timedelta(days=7))
+    assert viewed(admin) == (1, 0)
+
+    with app.app_context():
+        work_on(WEEK_START + timedelta(days=1))
+    assert viewed(admin) == (0, 1)
+    assert "Aman" in admin.get(REPORT).get_data(as_text=True)
+
+
+def test_only_report_fields_invalidate_on_user_changes(app, admin, login):
+    assert viewed(admin) == (0, 1)
+
+    staff = login("Aman", "aman123")
+    response = staff.post("/settings", data={
+        "action": "change_password", "current_password": "aman123",
+        "new_password": "aman456", "confirm_password": "aman456",
+    })
+    assert response.status_code == 302
+    staff.post("/settings", data={"action": "update_phone", "phone": "0400 000 000"})
+    assert viewed(admin) == (1, 0)
+
+    with app.app_context():
+        aman = User.query.filter_by(name="Aman").one()
+        form = {
+            "action": "update_employee", "user_id": aman.id, "role": aman.role,
+            "email": aman.email or "", "department": "Kitchen",
+            "employee_id": aman.employee_id or "", "position": aman.position or "",
+            "is_staff": "1" if aman.is_staff else "",
+        }
+    assert admin.post("/employee-management", data=form).status_code == 302
+    assert viewed(admin) == (0, 1)
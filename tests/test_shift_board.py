@@ -0,0 +1,76 @@
+"""Shift board events: today's state only, and no rows lost to id order."""
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import ActivityLog, User, db, func, shift_board_events
+
+
+def user_id(name):
+    return db.session.query(User.id).filter_by(name=name).scalar()
+
+
+def test_replayed_past_day_punches_keep_todays_row(app, login):
+    client = login("Aman", "aman123")
+    client.post("/action/clock_in")
+    with app.app_context():
+        aman = user_id("Aman")
+        after = db.session.query(func.max(ActivityLog.id)).scalar()
+
+    yesterday = datetime.now().replace(microsecond=0) - timedelta(days=1)
+    response = client.post("/api/v1/clock/batch", json={"events": [
+        {"id": "in", "user_id": aman, "event": "clock_in", "at": yesterday.replace(hour=9, minute=0).isoformat()},
+        {"id": "out", "user_id": aman, "event": "clock_out", "at": yesterday.replace(hour=17, minute=0).isoformat()},
+    ]})
+    assert [result["status"] for result in response.json["results"]] == ["applied", "applied"]
+
+    with app.app_context():
+        events = shift_board_events(after)
+    assert [event["action"] for event in events] == ["CLOCK_IN", "CLOCK_OUT"]
+    # Yesterday's clock-out must not take Aman off today's board.
+    assert all(event["row"] and event["row"]["user_id"] == aman for event in events)
+
+
+def read_event(body):
+    for chunk in body:
+        text = chunk.decode() if isinstance(chunk, bytes) else chunk
+        if text.startswith("event: "):
+            name, data = text.split("\n")[:2]
+            return name[len("event: "):], json.loads(data[len("data: "):])
+        if text.startswith(": keep-alive"):
+            return None, None
+
+
+@pytest.fixture
+def fast_stream(app, monkeypatch):
+    monkeypatch.setitem(app.config, "SHIFT_BOARD_POLL_SECONDS", 0.05)
+    monkeypatch.setitem(app.config, "SHIFT_BOARD_STREAM_SECONDS", 30)
+
+
+def test_stream_picks_up_rows_committed_out_of_id_order(app, login, fast_stream):
+    client = login()
+    with app.app_context():
+        aman = user_id("Aman")
+        top = db.session.query(func.max(ActivityLog.id)).scalar()
+
+    response = client.get("/admin/shift-board/stream", buffered=False,
+                          environ_overrides={"wsgi.multithread": True})
+    body = iter(response.response)
+    try:
+        assert read_event(body)[0] == "snapshot"
+
+        def log(log_id, action):
+            with app.app_context():
+                db.session.add(ActivityLog(id=log_id, user_id=aman, action=action, details="test"))
+                db.session.commit()
+
+        # A later id commits first, as a PostgreSQL sequence allows.
+        log(top + 10, "LUNCH_START")
+        assert read_event(body)[1]["id"] == top + 10
+        log(top + 5, "CLOCK_IN")
+        assert read_event(body)[1]["id"] == top + 5
+        # Nothing is sent twice.
+        assert read_event(body) == (None, None)
+    finally:
+        response.close()
@@ -0,0 +1,82 @@
+"""Incremental rollups must match a full rebuild."""
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import select
+
+from app import (
+    DailyTotals, TimeEntry, User, WeeklyTotals, check_totals, compute_totals, db,
+    rebuild_totals, refresh_totals
+)
+
+
+def stored_totals(conn):
+    return {
+        model.__tablename__: sorted(
+            tuple(row) for row in conn.execute(select(
+                model.user_id, getattr(model, key), model.work_minutes,
+                model.break_minutes, model.overtime_minutes
+            ))
+        )
+        for model, key in ((DailyTotals, "day"), (WeeklyTotals, "week_start"))
+    }
+
+
+def at(day, hour, minute=0):
+    return datetime.combine(day, datetime.min.time()).replace(hour=hour, minute=minute)
+
+
+def test_incremental_rollups_match_rebuild(app, login):
+    client = login("Aman", "aman123")
+    with app.app_context():
+        aman = db.session.query(User.id).filter_by(name="Aman").scalar()
+    # Three earlier days, spanning a week boundary, through the batch API.
+    days = [date.today() - timedelta(days=offset) for offset in (1, 3, 6)]
+    events = []
+    for day in days:
+        events += [
+            {"id": f"{day}-in", "user_id": aman, "event": "clock_in", "at": at(day, 9).isoformat()},
+            {"id": f"{day}-ls", "user_id": aman, "event": "lunch_start", "at": at(day, 12).isoformat()},
+            {"id": f"{day}-le", "user_id": aman, "event": "lunch_end", "at": at(day, 12, 30).isoformat()},
+            {"id": f"{day}-out", "user_id": aman, "event": "clock_out", "at": at(day, 19).isoformat()},
+        ]
+    results = client.post("/api/v1/clock/batch", json={"events": events}).json["results"]
+    assert {result["status"] for result in results} == {"applied"}
+
+    with app.app_context():
+        # An edit, as the admin and correction screens make it.
+        entry = TimeEntry.query.filter_by(user_id=aman, day=days[1]).one()
+        entry.clock_out = at(days[1], 21, 15)
+        refresh_totals(aman, [entry.day])
+        db.session.commit()
+        assert db.session.get(DailyTotals, (aman, days[1])).work_minutes == 12 * 60 - 15
+
+        with db.engine.connect() as conn:
+            assert check_totals(conn) == []
+            incremental = stored_totals(conn)
+        with db.engine.begin() as conn:
+            rebuild_totals(conn)
+        with db.engine.connect() as conn:
+            assert stored_totals(conn) == incremental
+            assert check_totals(conn) == []
+
+
+def test_check_totals_reports_drift(app):
+    with app.app_context():
+        user_id = db.session.query(User.id).filter_by(name="Aman").scalar()
+        day = date.today() - timedelta(days=2)
+        db.session.add(TimeEntry(user_id=user_id, day=day, clock_in=at(day, 9), clock_out=at(day, 17)))
+        db.session.commit()
+        with db.engine.connect() as conn:
+            problems = check_totals(conn)
+        assert any(f"daily_totals user {user_id} {day}" in problem for problem in problems)
+
+        runner = app.test_cli_runner()
+        assert runner.invoke(args=["check-totals"]).exit_code == 1
+        assert "Rebuilt" in runner.invoke(args=["rebuild-totals"]).output
+        assert runner.invoke(args=["check-totals"]).exit_code == 0
+
+
+def test_compute_totals_leaves_connection_options_alone(app):
+    with app.app_context(), db.engine.connect() as conn:
+        compute_totals(conn)
+        assert "yield_per" not in conn.get_execution_options()
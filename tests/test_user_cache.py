@@ -0,0 +1,73 @@
+"""A user change made by one worker must apply in every other worker at once."""
+import pytest
+
+from app import User, UserCache, db, load_user, user_cache, user_changed
+
+
+@pytest.fixture
+def slow_checks(app):
+    # A long check interval must not delay user changes.
+    previous = app.config.get("CACHE_CHECK_SECONDS")
+    app.config["CACHE_CHECK_SECONDS"] = 3600
+    yield
+    app.config["CACHE_CHECK_SECONDS"] = previous
+
+
+def staff_id():
+    return db.session.query(User.id).filter_by(name="Aman").scalar()
+
+
+def test_deactivation_applies_in_other_worker_immediately(app, slow_checks):
+    other_worker = UserCache()
+    with app.app_context():
+        user_id = staff_id()
+        assert load_user(str(user_id)) is not None
+        assert other_worker.get(user_id).is_active
+
+    with app.app_context():
+        # The admin request runs in the other worker.
+        db.session.get(User, user_id).is_active = False
+        user_changed(user_id)
+        db.session.commit()
+        other_worker.invalidate(user_id)
+
+    with app.app_context():
+        assert user_cache.get(user_id).is_active is False
+        assert load_user(str(user_id)) is None
+
+
+def test_role_change_applies_in_other_worker_immediately(app, slow_checks):
+    other_worker = UserCache()
+    with app.app_context():
+        user_id = staff_id()
+        assert load_user(str(user_id)).role != "admin"
+        other_worker.get(user_id)
+
+        db.session.get(User, user_id).role = "admin"
+        user_changed(user_id)
+        db.session.commit()
+        other_worker.invalidate(user_id)
+
+    with app.app_context():
+        assert load_user(str(user_id)).role == "admin"
+
+
+def test_unchanged_user_is_served_without_refetch(app, slow_checks):
+    with app.app_context():
+        user_id = staff_id()
+        first = user_cache.get(user_id)
+    with app.app_context():
+        assert user_cache.get(user_id) is first
+
+
+def test_deactivated_session_is_signed_out(app, login, slow_checks):
+    client = login("Aman", "aman123")
+    assert client.get("/dashboard").status_code == 200
+    with app.app_context():
+        # Deactivated by another worker: this worker's cache is not told.
+        db.session.get(User, staff_id()).is_active = False
+        user_changed(staff_id())
+        db.session.commit()
+    response = client.get("/dashboard")
+    assert response.status_code == 302
+    assert "/login" in response.headers["Location"]
@@ -0,0 +1,29 @@
+"""Lists built from the user directory are reused until a user changes."""
+from app import User, db, get_user_directory, invalidate_user, user_changed
+
+
+def test_dropdown_lists_are_cached_with_the_directory(app):
+    with app.app_context():
+        directory = get_user_directory()
+        choices = directory.choices
+        assert choices == sorted(choices, key=lambda choice: choice[1].lower())
+        assert "Floor" in directory.departments
+        assert get_user_directory().choices is choices
+
+        user = User.query.filter_by(name="Aman").one()
+        user.department = "Kitchen"
+        user_changed(user.id)
+        db.session.commit()
+        invalidate_user(user.id)
+
+        assert "Kitchen" in get_user_directory().departments
+        assert get_user_directory().choices is not choices
+
+
+def test_audit_log_user_filter(app, login):
+    client = login()
+    with app.app_context():
+        aman = db.session.query(User.id).filter_by(name="Aman").scalar()
+    page = client.get(f"/audit-log?user={aman}").get_data(as_text=True)
+    assert f'<option value="{aman}" selected>Aman</option>' in page
+    assert "Rohisa</option>" in page